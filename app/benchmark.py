@@ -0,0 +1,477 @@
+"""Throughput benchmarks for the heavier code paths.
+
+Run from the repo root, e.g.:
+    python app/benchmark.py splitter --size-mb 4
+    python app/benchmark.py images --count 300
+    python app/benchmark.py generation --concurrency 1 4 8 16
+    python app/benchmark.py importtime --budget-ms 300
+    python app/benchmark.py retention --chunks 20000
+    python app/benchmark.py shards --shards 1 2 4 8 --cores 1 2 4
+    python app/benchmark.py facts --chunks 20000
+"""
+import argparse
+import io
+import os
+import random
+import subprocess
+import sys
+import textwrap
+import time
+
+from text_splitter import PageAwareTextSplitter
+
+SAMPLE_WORDS = (
+    "sales revenue growth operational billion million percent litigation talc "
+    "opioid research development pipeline segment medtech innovative medicine "
+    "dividend shareholders patent exclusivity manufacturing employees the and of "
+    "to in for was were increased decreased compared with prior year"
+).split()
+
+
+def make_report_text(size_mb, seed=0, layout="paragraphs"):
+    """Build synthetic report-like text with sentences, paragraphs and pages.
+
+    layout="paragraphs" separates paragraphs with blank lines; "lines" wraps
+    every paragraph at about 90 characters with single newlines, which is
+    what PyPDF2's extract_text usually returns.
+    """
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    pages = []
+    total = 0
+    while total < target:
+        paragraphs = []
+        for _ in range(rng.randint(3, 8)):
+            sentences = []
+            for _ in range(rng.randint(2, 7)):
+                words = rng.choices(SAMPLE_WORDS, k=rng.randint(6, 24))
+                sentences.append(" ".join(words).capitalize() + rng.choice([".", ".", ".", "?", "!"]))
+            paragraphs.append(" ".join(sentences))
+        if layout == "lines":
+            page = "\n".join(textwrap.fill(paragraph, 90) for paragraph in paragraphs)
+        else:
+            page = "\n\n".join(paragraphs)
+        pages.append(page)
+        total += len(page) + 2
+    return pages
+
+
+def _timed(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _baseline_split(splitter, pages):
+    """The pre-PageAwareTextSplitter ingest path: page markers, then LangChain"""
+    text = ""
+    for page_num, page_text in enumerate(pages):
+        text += f"\n--- PAGE {page_num + 1} ---\n{page_text}\n"
+    return splitter.split_text(text.strip())
+
+
+def bench_splitter(size_mb=4.0, repeat=3, layouts=("paragraphs", "lines")):
+    """Compare PageAwareTextSplitter with LangChain's RecursiveCharacterTextSplitter"""
+    separators = ["\n\n", "\n", ". ", "? ", "! ", " ", ""]
+    fast = PageAwareTextSplitter(chunk_size=1200, chunk_overlap=200, separators=separators)
+    try:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        baseline = RecursiveCharacterTextSplitter(chunk_size=1200, chunk_overlap=200, separators=separators)
+    except ImportError:
+        print("langchain not installed; skipping baseline")
+        baseline = None
+
+    rows = []
+    for layout in layouts:
+        pages = make_report_text(size_mb, layout=layout)
+        text = "\n\n".join(pages)
+        mb = len(text) / (1024 * 1024)
+        layout_rows = []
+
+        elapsed, chunks = _timed(lambda: fast.split_text(text), repeat)
+        layout_rows.append(("PageAwareTextSplitter.split_text", elapsed, len(chunks)))
+        elapsed, chunks = _timed(lambda: fast.split_pages(pages, "bench"), repeat)
+        layout_rows.append(("PageAwareTextSplitter.split_pages", elapsed, len(chunks)))
+        if baseline is not None:
+            elapsed, chunks = _timed(lambda: baseline.split_text(text), repeat)
+            layout_rows.append(("RecursiveCharacterTextSplitter", elapsed, len(chunks)))
+            elapsed, chunks = _timed(lambda: _baseline_split(baseline, pages), repeat)
+            layout_rows.append(("baseline ingest (markers + LangChain)", elapsed, len(chunks)))
+
+        print(f"Splitting {mb:.2f} MB ({len(pages)} pages, {layout}), best of {repeat}")
+        for name, elapsed, count in layout_rows:
+            print(f"  {name:38s} {elapsed * 1000:9.1f} ms  {mb / elapsed:8.1f} MB/s  {count:7d} chunks")
+        rows.extend((layout,) + row for row in layout_rows)
+    return rows
+
+
+def make_screenshots(count, size=(1600, 900), seed=0):
+    """Render synthetic bar charts, tables and text pages as JPEG/PNG bytes"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    images = []
+    for i in range(count):
+        image = Image.new("RGB", size, "white")
+        draw = ImageDraw.Draw(image)
+        kind = i % 3
+        if kind == 0:
+            draw.line([(80, 50), (80, size[1] - 60), (size[0] - 40, size[1] - 60)], fill="black", width=3)
+            for b in range(12):
+                top = rng.randint(100, size[1] - 100)
+                color = tuple(rng.randint(0, 255) for _ in range(3))
+                draw.rectangle([120 + b * 110, top, 190 + b * 110, size[1] - 62], fill=color)
+        elif kind == 1:
+            for y in range(40, size[1], rng.randint(30, 50)):
+                draw.line([(20, y), (size[0] - 20, y)], fill="gray", width=2)
+            for x in range(20, size[0], rng.randint(150, 250)):
+                draw.line([(x, 40), (x, size[1] - 20)], fill="gray", width=2)
+        else:
+            for y in range(30, size[1] - 30, 18):
+                draw.text((40, y), " ".join(rng.choices(SAMPLE_WORDS, k=20)), fill="black")
+        buf = io.BytesIO()
+        image.save(buf, format="JPEG" if i % 2 else "PNG", quality=85)
+        images.append(buf.getvalue())
+    return images
+
+
+def bench_images(count=300, workers=None):
+    """Throughput of MultimodalProcessor.analyze_images, cold and cached"""
+    from multimodal_processor import MultimodalProcessor
+
+    images = make_screenshots(count)
+    processor = MultimodalProcessor()
+
+    start = time.perf_counter()
+    for data in images[:50]:
+        processor._analyze_image_bytes(data)
+    serial = (time.perf_counter() - start) / min(50, count)
+
+    start = time.perf_counter()
+    results = processor.analyze_images(images, max_workers=workers)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    processor.analyze_images(images, max_workers=workers)
+    warm = time.perf_counter() - start
+
+    kinds = {}
+    for result in results:
+        kinds[result.get("visual_type", "error")] = kinds.get(result.get("visual_type", "error"), 0) + 1
+
+    print(f"Analyzing {count} screenshots on {os.cpu_count()} cores")
+    print(f"  serial (per image)   {serial * 1000:9.1f} ms  {1 / serial:8.1f} img/s")
+    print(f"  batch, cold cache    {cold * 1000:9.1f} ms  {count / cold:8.1f} img/s")
+    print(f"  batch, warm cache    {warm * 1000:9.1f} ms  {count / warm:8.1f} img/s")
+    print(f"  visual types: {kinds}")
+    return serial, cold, warm
+
+
+def bench_generation(concurrency_levels=(1, 4, 8, 16), requests_per_level=32,
+                     model_name="google/flan-t5-small", max_batch_size=8):
+    """Latency and tokens/sec of GenerationService at several concurrency levels"""
+    import statistics
+    from concurrent.futures import ThreadPoolExecutor
+    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+    from generation import ContextPacker, GenerationService
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+    packer = ContextPacker(tokenizer, max_input_tokens=512)
+    paragraphs = "\n\n".join(make_report_text(0.2)).split("\n\n")
+
+    print(f"Generation with {model_name}, {requests_per_level} requests per level")
+    results = []
+    for level, concurrency in enumerate(concurrency_levels):
+        service = GenerationService(model, tokenizer, max_batch_size=max_batch_size, max_input_tokens=512)
+        # Distinct questions per level so the output cache doesn't hide model time
+        jobs = []
+        for i in range(requests_per_level):
+            question = f"What happened to sales in segment {level}-{i}?"
+            docs = paragraphs[i % len(paragraphs):i % len(paragraphs) + 5]
+            jobs.append((question, packer.pack(docs, question)))
+
+        def run(job):
+            start = time.perf_counter()
+            service.generate(*job)
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = sorted(pool.map(run, jobs))
+        wall = time.perf_counter() - start
+        service.close()
+
+        p50 = statistics.median(latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        avg_batch = service.stats["batched_requests"] / max(service.stats["batches"], 1)
+        tokens_per_sec = service.stats["generated_tokens"] / wall
+        print(f"  concurrency {concurrency:3d}: p50 {p50 * 1000:8.1f} ms  p95 {p95 * 1000:8.1f} ms  "
+              f"{requests_per_level / wall:6.2f} req/s  {tokens_per_sec:8.1f} tok/s  avg batch {avg_batch:.1f}  "
+              f"cache hits {service.stats['cache_hits']}  deduplicated {service.stats['deduplicated']}")
+        results.append((concurrency, p50, p95, tokens_per_sec))
+    return results
+
+
+def _query_latency(rag_engine, queries):
+    start = time.perf_counter()
+    for query in queries:
+        rag_engine.search_documents(query, num_results=5)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def bench_retention(num_chunks=20000, keep_fraction=0.5, num_queries=200):
+    """Search latency and disk use: full index, after eviction, after compaction"""
+    import tempfile
+    from langchain.embeddings import FakeEmbeddings
+    from rag_engine import RAGEngine, RetentionPolicy, _directory_size
+
+    paragraphs = "\n\n".join(make_report_text(num_chunks * 600 / 1024 / 1024)).split("\n\n")[:num_chunks]
+    queries = [" ".join(random.Random(i).choices(SAMPLE_WORDS, k=8)) for i in range(num_queries)]
+
+    with tempfile.TemporaryDirectory() as persist_directory:
+        # Random vectors keep the model out of the measurement; only the store is timed
+        rag_engine = RAGEngine(persist_directory=persist_directory, embedding_function=FakeEmbeddings(size=384))
+        batch = 1000
+        for start in range(0, len(paragraphs), batch):
+            rag_engine.add_documents([(text, f"filing-{i % 50}", None)
+                                      for i, text in enumerate(paragraphs[start:start + batch], start)])
+
+        rows = [("full index", len(rag_engine.chunk_index), _query_latency(rag_engine, queries),
+                 _directory_size(persist_directory))]
+
+        rag_engine.retention = RetentionPolicy(max_chunks=int(len(paragraphs) * keep_fraction))
+        rag_engine.enforce_retention()
+        rows.append(("after eviction", len(rag_engine.chunk_index), _query_latency(rag_engine, queries),
+                     _directory_size(persist_directory)))
+
+        rag_engine.compact()
+        rows.append(("after compaction", len(rag_engine.chunk_index), _query_latency(rag_engine, queries),
+                     _directory_size(persist_directory)))
+
+    print(f"Retention with {len(paragraphs)} chunks, keeping {keep_fraction:.0%}, {num_queries} queries")
+    for name, chunks, latency, size in rows:
+        print(f"  {name:18s} {chunks:7d} chunks  {latency * 1000:8.2f} ms/query  {size / 1024 / 1024:8.1f} MB on disk")
+    return rows
+
+
+def bench_shards(shard_counts=(1, 2, 4, 8), core_counts=(None,), num_chunks=50000, num_queries=300, dim=384):
+    """Query latency and throughput of ShardedIndex across shard and core counts"""
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    from langchain.embeddings import FakeEmbeddings
+    from langchain.schema import Document as LangchainDoc
+    from sharded_index import ShardedIndex
+
+    embeddings = FakeEmbeddings(size=dim)
+    docs = [LangchainDoc(page_content=f"chunk {i}", metadata={"source": f"filing-{i % 400}"})
+            for i in range(num_chunks)]
+    ids = [f"c{i}" for i in range(num_chunks)]
+    queries = [f"query {i}" for i in range(num_queries)]
+    all_cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None
+
+    print(f"Sharded search over {num_chunks} chunks ({dim}-d), {num_queries} queries, k=5")
+    rows = []
+    for cores in core_counts:
+        # Shard processes inherit the parent's CPU affinity
+        if cores and all_cores:
+            os.sched_setaffinity(0, set(all_cores[:cores]))
+        for shards in shard_counts:
+            with tempfile.TemporaryDirectory() as persist_directory:
+                index = ShardedIndex(persist_directory, embeddings, num_shards=shards)
+                for start in range(0, num_chunks, 5000):
+                    index.add_documents(docs[start:start + 5000], ids[start:start + 5000])
+
+                latencies = []
+                for query in queries:
+                    start = time.perf_counter()
+                    index.similarity_search(query, k=5)
+                    latencies.append(time.perf_counter() - start)
+                latencies.sort()
+
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=8) as pool:
+                    list(pool.map(lambda q: index.similarity_search(q, k=5), queries))
+                qps = num_queries / (time.perf_counter() - start)
+                index.close()
+
+            p50 = latencies[len(latencies) // 2]
+            p95 = latencies[int(len(latencies) * 0.95)]
+            label = cores or (len(all_cores) if all_cores else os.cpu_count())
+            print(f"  cores {label:3d}  shards {shards:3d}: p50 {p50 * 1000:7.2f} ms  "
+                  f"p95 {p95 * 1000:7.2f} ms  {qps:8.1f} queries/s")
+            rows.append((label, shards, p50, p95, qps))
+    if all_cores:
+        os.sched_setaffinity(0, set(all_cores))
+    return rows
+
+
+def bench_facts(num_chunks=20000, repeat=2000):
+    """Fact extraction throughput at ingest and lookup latency at query time"""
+    from fact_index import FactIndex
+
+    rng = random.Random(0)
+    labels = ["Worldwide sales", "Research and development expense", "Net earnings", "The quarterly dividend"]
+    chunks = []
+    for i in range(num_chunks):
+        filler = " ".join(rng.choices(SAMPLE_WORDS, k=60)).capitalize() + "."
+        fact = (f"{rng.choice(labels)} was ${rng.uniform(1, 99):.1f} billion in {rng.randint(2015, 2024)}, "
+                f"up {rng.uniform(0, 12):.1f} percent.")
+        chunks.append(f"{filler} {fact} {filler}")
+
+    index = FactIndex()
+    start = time.perf_counter()
+    for i, chunk in enumerate(chunks):
+        index.add_chunk(f"c{i}", chunk, f"filing-{i % 100}")
+    elapsed = time.perf_counter() - start
+    mb = sum(len(chunk) for chunk in chunks) / 1024 / 1024
+
+    print(f"Fact index over {num_chunks} chunks: {len(index)} facts, "
+          f"extracted at {mb / elapsed:.1f} MB/s ({elapsed * 1000:.0f} ms)")
+    questions = [
+        "What was the financial performance in 2023?",
+        "How much was invested in research and development?",
+        "What was the dividend in 2019?",
+        "What are the major risk factors mentioned?",
+    ]
+    # Filings disagree on every figure here, so only lookups scoped to one filing hit
+    for source in (None, "filing-7"):
+        print(f"  scoped to {source}" if source else "  across all filings")
+        for question in questions:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                result = index.answer(question, source=source)
+            micros = (time.perf_counter() - start) / repeat * 1e6
+            print(f"    {micros:8.1f} us  {'hit ' if result else 'miss'}  {question}")
+
+    removed = [f"c{i}" for i in range(0, num_chunks, 2)]
+    start = time.perf_counter()
+    for i in range(0, len(removed), 50):
+        index.remove_chunks(removed[i:i + 50])
+    print(f"  removed {len(removed)} chunks in batches of 50: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+APP_MODULES = [
+    "utils", "evaluator", "text_splitter", "generation", "document_processor",
+    "multimodal_processor", "rag_engine", "visualizer", "profiling", "cli", "sharded_index", "fact_index",
+    "main",
+]
+STREAMLIT_STUB = (
+    "import sys, types; st = types.ModuleType('streamlit'); "
+    "st.__getattr__ = lambda name: (lambda *args, **kwargs: None); sys.modules['streamlit'] = st"
+)
+HEAVY_MODULES = ["torch", "transformers", "langchain", "chromadb", "matplotlib", "wordcloud"]
+
+
+def measure_import_time(modules=APP_MODULES):
+    """Cold-import modules in a fresh interpreter under -X importtime.
+
+    Returns (total microseconds, {top-level import: cumulative microseconds},
+    set of every module that got imported).
+    """
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    code = "; ".join(f"import {name}" for name in modules)
+    if "main" in modules:
+        # main.py needs streamlit at import time; a stub whose st.* calls do
+        # nothing keeps the measurement to the app's own imports
+        code = STREAMLIT_STUB + "; " + code
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=app_dir, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    packages = {}
+    loaded = set()
+    total = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        loaded.add(name.strip())
+        # Nested imports are indented by two spaces per level
+        if name[1:2] == " ":
+            continue
+        packages[name.strip()] = int(cumulative)
+        total += int(cumulative)
+    return total, packages, loaded
+
+
+def check_import_budget(budget_ms=300.0, modules=APP_MODULES):
+    """Fail if cold-importing the app pulls in heavy libraries or exceeds the budget"""
+    total, packages, loaded = measure_import_time(modules)
+    heavy = [name for name in HEAVY_MODULES if name in {module.split(".")[0] for module in loaded}]
+
+    print(f"Cold import of {len(modules)} app modules: {total / 1000:.1f} ms (budget {budget_ms:.0f} ms)")
+    for name, micros in sorted(packages.items(), key=lambda item: -item[1])[:10]:
+        print(f"  {name:40s} {micros / 1000:8.1f} ms")
+
+    ok = True
+    if heavy:
+        print(f"FAIL: heavy modules imported eagerly: {', '.join(heavy)}")
+        ok = False
+    if total / 1000 > budget_ms:
+        print("FAIL: cold import time over budget")
+        ok = False
+    if ok:
+        print("OK")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    splitter = sub.add_parser("splitter", help="text splitter throughput")
+    splitter.add_argument("--size-mb", type=float, default=4.0)
+    splitter.add_argument("--repeat", type=int, default=3)
+    splitter.add_argument("--layout", choices=["paragraphs", "lines"], nargs="+", default=["paragraphs", "lines"])
+
+    images = sub.add_parser("images", help="batch image analysis throughput")
+    images.add_argument("--count", type=int, default=300)
+    images.add_argument("--workers", type=int, default=None)
+
+    generation = sub.add_parser("generation", help="batched generation latency and tokens/sec")
+    generation.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    generation.add_argument("--requests", type=int, default=32)
+    generation.add_argument("--max-batch-size", type=int, default=8)
+
+    importtime = sub.add_parser("importtime", help="fail if cold app import time regresses")
+    importtime.add_argument("--budget-ms", type=float, default=300.0)
+
+    retention = sub.add_parser("retention", help="search latency before and after eviction and compaction")
+    retention.add_argument("--chunks", type=int, default=20000)
+    retention.add_argument("--keep", type=float, default=0.5)
+
+    shards = sub.add_parser("shards", help="scatter-gather search scaling by shard and core count")
+    shards.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    shards.add_argument("--cores", type=int, nargs="+", default=[None])
+    shards.add_argument("--chunks", type=int, default=50000)
+
+    facts = sub.add_parser("facts", help="numeric fact extraction and lookup speed")
+    facts.add_argument("--chunks", type=int, default=20000)
+
+    args = parser.parse_args()
+    if args.bench == "splitter":
+        bench_splitter(args.size_mb, args.repeat, args.layout)
+    elif args.bench == "images":
+        bench_images(args.count, args.workers)
+    elif args.bench == "generation":
+        bench_generation(args.concurrency, args.requests, max_batch_size=args.max_batch_size)
+    elif args.bench == "retention":
+        bench_retention(args.chunks, args.keep)
+    elif args.bench == "shards":
+        bench_shards(args.shards, args.cores, args.chunks)
+    elif args.bench == "facts":
+        bench_facts(args.chunks)
+    elif args.bench == "importtime":
+        sys.exit(0 if check_import_budget(args.budget_ms) else 1)
+
+
+if __name__ == "__main__":
+    main()
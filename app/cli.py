@@ -0,0 +1,264 @@
+"""Headless batch runs: bulk ingest and bulk Q&A over JSONL.
+
+Run from the repo root, e.g.:
+    python app/cli.py ingest filings/ --workers 4
+    python app/cli.py ask questions.jsonl --output answers.jsonl --workers 4
+    python app/cli.py run filings/ questions.jsonl --output answers.jsonl
+    python app/cli.py --max-chunks 200000 --ttl-days 365 compact
+    python app/cli.py --shards 8 ingest filings/
+
+Both steps can be interrupted and re-run: files already listed in the
+ingest manifest and question ids already present in the output are skipped.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from utils import setup_logging
+
+SUPPORTED_TYPES = ('pdf', 'txt')
+MANIFEST_NAME = "ingested.jsonl"
+
+
+def _parse_file(path, source):
+    """Worker: read and chunk one file in a separate process"""
+    from document_processor import DocumentProcessor
+
+    start = time.perf_counter()
+    chunks = DocumentProcessor().process_business_document(path, source=source) or []
+    items = [(chunk.text, source, chunk.metadata()) for chunk in chunks]
+    return source, items, time.perf_counter() - start
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+
+def _read_manifest(manifest_path):
+    done = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    done[entry["source"]] = entry
+    return done
+
+
+def find_documents(directory):
+    """Supported files under directory, as (path, source relative to directory)"""
+    found = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.lower().split('.')[-1] in SUPPORTED_TYPES:
+                path = os.path.join(root, name)
+                found.append((path, os.path.relpath(path, directory)))
+    return sorted(found, key=lambda item: item[1])
+
+
+def ingest(rag_engine, directory, workers=None):
+    """Chunk files in a process pool and add them to the engine as they finish"""
+    logger = setup_logging()
+    os.makedirs(rag_engine.persist_directory, exist_ok=True)
+    manifest_path = os.path.join(rag_engine.persist_directory, MANIFEST_NAME)
+    done = _read_manifest(manifest_path)
+
+    documents = find_documents(directory)
+    pending = []
+    for path, source in documents:
+        entry = done.get(source)
+        key = _file_key(path)
+        if entry and entry["size"] == key["size"] and entry["mtime"] == key["mtime"]:
+            continue
+        pending.append((path, source))
+
+    skipped = len(documents) - len(pending)
+    logger.info(f"Ingesting {len(pending)} files ({skipped} already done)")
+
+    start = time.perf_counter()
+    total_chunks = 0
+    total_bytes = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(manifest_path, 'a', encoding='utf-8') as manifest:
+        futures = {pool.submit(_parse_file, path, source): path for path, source in pending}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                source, items, parse_seconds = future.result()
+            except Exception as e:
+                logger.error(f"❌ Failed to process {path}: {e}")
+                continue
+            # A file that changed, or was half-added before an interruption, is replaced wholesale
+            rag_engine.remove_source(source)
+            rag_engine.add_documents(items)
+            entry = {"source": source, "chunks": len(items), "parse_seconds": round(parse_seconds, 3), **_file_key(path)}
+            manifest.write(json.dumps(entry) + "\n")
+            manifest.flush()
+            total_chunks += len(items)
+            total_bytes += entry["size"]
+
+    elapsed = time.perf_counter() - start
+    return {
+        "files": len(pending),
+        "skipped_files": skipped,
+        "chunks": total_chunks,
+        "seconds": round(elapsed, 2),
+        "files_per_second": round(len(pending) / elapsed, 2) if elapsed else 0.0,
+        "mb_per_second": round(total_bytes / 1024 / 1024 / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def read_questions(questions_path):
+    """Yield (id, question) from a JSONL file; ids default to the line number"""
+    with open(questions_path, encoding='utf-8') as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"question": record}
+            question = record.get("question") or record.get("text")
+            if not question:
+                continue
+            yield str(record.get("id", line_number)), question
+
+
+def _answered_ids(output_path):
+    answered = set()
+    if output_path != "-" and os.path.exists(output_path):
+        with open(output_path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    answered.add(str(json.loads(line)["id"]))
+                except (ValueError, KeyError):
+                    # A line cut off by an interruption; that question is asked again
+                    continue
+    return answered
+
+
+def ask(rag_engine, questions_path, output_path, workers=4):
+    """Answer every question, streaming one JSON line per answer"""
+    answered = _answered_ids(output_path)
+    questions = [(qid, q) for qid, q in read_questions(questions_path) if qid not in answered]
+    setup_logging().info(f"Answering {len(questions)} questions ({len(answered)} already answered)")
+
+    def run(item):
+        qid, question = item
+        start = time.perf_counter()
+        answer, sources = rag_engine.answer_with_sources(question)
+        return {
+            "id": qid,
+            "question": question,
+            "answer": answer,
+            "seconds": round(time.perf_counter() - start, 4),
+            "sources": sources,
+        }
+
+    out = sys.stdout if output_path == "-" else open(output_path, 'a+', encoding='utf-8')
+    if out is not sys.stdout and out.tell():
+        out.seek(out.tell() - 1)
+        if out.read(1) != "\n":
+            out.write("\n")
+    latencies = []
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for result in pool.map(run, questions):
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                latencies.append(result["seconds"])
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "questions": len(latencies),
+        "skipped_questions": len(answered),
+        "seconds": round(elapsed, 2),
+        "questions_per_second": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_seconds": round(statistics.median(latencies), 4) if latencies else 0.0,
+        "p95_seconds": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 4) if latencies else 0.0,
+    }
+
+
+def print_summary(summary):
+    print("Throughput summary", file=sys.stderr)
+    for key, value in summary.items():
+        print(f"  {key:22s} {value}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--persist-directory", default="./chroma_db")
+    parser.add_argument("--enable-generation", action="store_true")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="split the index over this many shard processes; an existing unsharded index is "
+                             "migrated and a sharded one is rebalanced to the new count "
+                             "(1 keeps whatever count the index already has)")
+    parser.add_argument("--shard-by", choices=["source", "hash"], default=None,
+                        help="how chunks are placed on shards (default: source); changing it on an existing "
+                             "sharded index rebalances")
+    parser.add_argument("--max-chunks", type=int, default=None, help="retention: keep at most this many chunks")
+    parser.add_argument("--max-mb", type=float, default=None, help="retention: keep at most this much chunk text")
+    parser.add_argument("--ttl-days", type=float, default=None, help="retention: drop chunks older than this")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = sub.add_parser("ingest", help="add a directory of PDF/TXT files to the index")
+    ingest_parser.add_argument("directory")
+    ingest_parser.add_argument("--workers", type=int, default=None, help="parsing processes (default: CPU count)")
+
+    ask_parser = sub.add_parser("ask", help="answer questions from a JSONL file")
+    ask_parser.add_argument("questions")
+    ask_parser.add_argument("--output", default="-", help="JSONL output path, or - for stdout")
+    ask_parser.add_argument("--workers", type=int, default=4, help="concurrent questions")
+
+    run_parser = sub.add_parser("run", help="ingest, then answer questions")
+    run_parser.add_argument("directory")
+    run_parser.add_argument("questions")
+    run_parser.add_argument("--output", default="-")
+    run_parser.add_argument("--ingest-workers", type=int, default=None)
+    run_parser.add_argument("--workers", type=int, default=4)
+
+    sub.add_parser("compact", help="apply retention and reclaim disk space in the index")
+
+    args = parser.parse_args(argv)
+
+    from rag_engine import RAGEngine, RetentionPolicy
+
+    retention = RetentionPolicy(
+        max_chunks=args.max_chunks,
+        max_bytes=int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None,
+        ttl_seconds=args.ttl_days * 86400 if args.ttl_days is not None else None
+    )
+    rag_engine = RAGEngine(
+        enable_generation=args.enable_generation,
+        persist_directory=args.persist_directory,
+        retention=retention,
+        num_shards=args.shards,
+        shard_by=args.shard_by
+    )
+    rag_engine.load_persisted()
+
+    summary = {}
+    if args.command in ("ingest", "run"):
+        workers = args.workers if args.command == "ingest" else args.ingest_workers
+        summary.update({f"ingest_{k}": v for k, v in ingest(rag_engine, args.directory, workers).items()})
+    if args.command in ("ask", "run"):
+        summary.update({f"ask_{k}": v for k, v in ask(rag_engine, args.questions, args.output, args.workers).items()})
+    if args.command == "compact":
+        summary["evicted_chunks"] = rag_engine.enforce_retention()
+        summary.update({f"compact_{k}": v for k, v in rag_engine.compact().items()})
+    rag_engine.save_retrieval_times()
+    print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
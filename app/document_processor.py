@@ -1,40 +1,44 @@
-import PyPDF2
 import os
 import re
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import Chroma
 
-from utils import setup_logging
+from profiling import get_profiler
+from text_splitter import PageAwareTextSplitter, PAGE_JOINER
+from utils import setup_logging, load_embeddings
 
 class DocumentProcessor:
     def __init__(self):
         self.logger = setup_logging()
-        self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        self.text_splitter = RecursiveCharacterTextSplitter(
+        self.text_splitter = PageAwareTextSplitter(
             chunk_size=1200,  
             chunk_overlap=200,  
             separators=["\n\n", "\n", ". ", "? ", "! ", " ", ""] 
         )
+
+    @property
+    def embeddings(self):
+        return load_embeddings()
         
-    def read_pdf(self, file_path):
-        """Read text from PDF file with better parsing"""
+    def read_pdf_pages(self, file_path):
+        """Read a PDF as a list of page texts (empty pages kept so numbering holds)"""
+        import PyPDF2
+
         try:
-            text = ""
+            pages = []
             with open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
-                for page_num, page in enumerate(pdf_reader.pages):
-                    page_text = page.extract_text()
-                    if page_text:
-                        
-                        text += f"\n--- PAGE {page_num + 1} ---\n{page_text}\n"
+                for page in pdf_reader.pages:
+                    pages.append(page.extract_text() or "")
             
-            self.logger.info(f"Read PDF with {len(pdf_reader.pages)} pages")
-            return text.strip()
+            self.logger.info(f"Read PDF with {len(pages)} pages")
+            return pages
             
         except Exception as e:
             self.logger.error(f"Error reading PDF: {e}")
-            return ""
+            return []
+
+    def read_pdf(self, file_path):
+        """Read text from PDF file with better parsing"""
+        return PAGE_JOINER.join(self.read_pdf_pages(file_path)).strip()
     
     def read_text_file(self, file_path):
         """Read text from .txt file"""
@@ -47,19 +51,40 @@ class DocumentProcessor:
             self.logger.error(f"Error reading text file: {e}")
             return ""
     
-    def process_business_document(self, file_path):
-        """Specialized processor for business reports with better chunking"""
-        content = self.process_file(file_path)
-        if not content:
+    def read_pages(self, file_path):
+        """Read any supported file as a list of pages"""
+        file_type = file_path.lower().split('.')[-1]
+        
+        if file_type == 'pdf':
+            return self.read_pdf_pages(file_path)
+        elif file_type == 'txt':
+            content = self.read_text_file(file_path)
+            return [content] if content else []
+        else:
+            self.logger.warning(f"Unsupported file type: {file_type}")
+            return []
+    
+    def process_business_document(self, file_path, source=None):
+        """Specialized processor for business reports with better chunking.
+
+        Returns a list of Chunk objects; page range and character offsets
+        live on each chunk instead of inline page markers.
+        """
+        source = source or os.path.basename(file_path)
+        with get_profiler().trace_memory("ingest", {"source": source, "file": file_path}):
+            return self._chunk_business_document(file_path, source)
+
+    def _chunk_business_document(self, file_path, source):
+        pages = self.read_pages(file_path)
+        if not any(page.strip() for page in pages):
             return None
         
        
-        chunks = self.text_splitter.split_text(content)
+        chunks = self.text_splitter.split_pages(pages, source)
         
         
-        enhanced_chunks = []
         for chunk in chunks:
-            chunk_lower = chunk.lower()
+            chunk_lower = chunk.text.lower()
             chunk_type = "general"
             
             if any(word in chunk_lower for word in ['lawsuit', 'litigation', 'talc', 'opioid', 'legal']):
@@ -71,10 +96,10 @@ class DocumentProcessor:
             elif any(word in chunk_lower for word in ['research', 'development', 'r&d', 'pipeline']):
                 chunk_type = "innovation"
                 
-            enhanced_chunk = f"[{chunk_type.upper()} SECTION] {chunk}"
-            enhanced_chunks.append(enhanced_chunk)
+            chunk.section = chunk_type
+            chunk.text = f"[{chunk_type.upper()} SECTION] {chunk.text}"
         
-        return enhanced_chunks
+        return chunks
     
     def process_file(self, file_path):
         """Process any supported file type"""
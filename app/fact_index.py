@@ -0,0 +1,357 @@
+"""Numeric facts (amounts, percentages, years) pulled out of chunks at ingest.
+
+Facts live in a small columnar table: one typed array per column plus a
+(metric, year) -> rows dict. Questions that plainly ask for a known
+metric's figure are answered from the table when every filing that has it
+agrees; everything else, including questions about drivers, impact, risk
+or a single segment, falls back to vector search.
+"""
+import re
+from array import array
+
+METRIC_LABELS = {
+    "sales": ["sales", "revenue", "revenues", "operational sales"],
+    "rd": ["research and development", "research & development", "r&d"],
+    "net_income": ["net income", "net earnings", "net profit"],
+    "dividend": ["dividend", "dividends"],
+    "eps": ["earnings per share", "eps"],
+    "cash_flow": ["free cash flow", "cash flow from operations", "cash flow"],
+    "capex": ["capital expenditures", "capital expenditure", "capex"],
+}
+# Extra phrasings that only make sense in a question
+QUESTION_ALIASES = {
+    "financial performance": ["sales", "net_income"],
+    "research": ["rd"],
+    "innovation": ["rd"],
+    "profit": ["net_income"],
+    "earnings": ["net_income"],
+}
+METRICS = list(METRIC_LABELS)
+
+KIND_MONEY = 0
+KIND_PERCENT = 1
+SCALES = {"thousand": 1e3, "million": 1e6, "billion": 1e9, "trillion": 1e12}
+
+_LABEL_PATTERN = re.compile(
+    r"(?<![a-z])(" + "|".join(
+        re.escape(label) for label in sorted(
+            (label for labels in METRIC_LABELS.values() for label in labels), key=len, reverse=True
+        )
+    ) + r")(?![a-z])"
+)
+_LABEL_TO_METRIC = {label: metric for metric, labels in METRIC_LABELS.items() for label in labels}
+_QUESTION_PATTERN = re.compile(
+    r"(?<![a-z])(" + "|".join(
+        re.escape(phrase) for phrase in sorted(list(_LABEL_TO_METRIC) + list(QUESTION_ALIASES), key=len, reverse=True)
+    ) + r")(?![a-z])"
+)
+_WHAT_WAS_METRIC = re.compile(
+    r"\s*what (?:was|were|is|are) (?:the |its |their |our )?(?:company's |total |annual |reported )*"
+    + _QUESTION_PATTERN.pattern
+)
+# What a routed question may contain from its first metric on: more metrics,
+# "growth", years and closing punctuation. Anything else ("of Stelara",
+# "in Europe", "recognition policy") asks for more than the table knows.
+_FIGURE_TAIL = re.compile(
+    _QUESTION_PATTERN.pattern + r"(?:\s*(?:,|and|&)\s*" + _QUESTION_PATTERN.pattern + r")*"
+    r"(?:\s+growth(?:\s+rate)?)?"
+    r"(?:\s+(?:in|for|during)?\s*(?:fiscal\s+)?(?:19|20)\d{2}(?:\s*(?:,|and|or)\s*(?:19|20)\d{2})*)?"
+    r"\s*[?.!]?\s*"
+)
+_MONEY_PATTERN = re.compile(
+    r"(\$\s?)?(\d{1,3}(?:,\d{3})+|\d+)(\.\d+)?\s*(thousand|million|billion|trillion)\b"
+    r"|\$\s?(\d{1,3}(?:,\d{3})+|\d+)(\.\d+)?"
+)
+_PERCENT_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s?(?:%|percent\b)")
+_YEAR_PATTERN = re.compile(r"(?<![\d$.,])((?:19|20)\d{2})(?![\d%]|\s?percent)")
+_DIGIT = re.compile(r"\d")
+_SECTION_TAG = re.compile(r"^\[[A-Z]+ SECTION\]\s*")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_HOW_MUCH = re.compile(r"\bhow (much|many)\b")
+# Anything asking for an explanation rather than a figure goes to vector search
+_QUALITATIVE = re.compile(
+    r"\b(why|how (?:does|do|did|is|are|was|were|has|have|will|would|could|can)|driv\w*|drove|impact\w*|"
+    r"affect\w*|effect\w*|risk\w*|reason\w*|caus\w*|factor\w*|explain\w*|describe\w*|discuss\w*|"
+    r"strateg\w*|outlook|contribut\w*|compare\w*|exposure|related)\b"
+)
+_PERCENT_CUES = re.compile(r"\b(percent\w*|rate|grow(?:th)?|increase|decrease|decline)\b|%")
+_MONEY_CUES = re.compile(r"\b(how much|amount|invest\w*|spen[dt]\w*|paid|pay|cost|dollars?)\b|\$")
+
+
+def parse_question(question):
+    """Return (metrics, years, preferred kind or None), or None if the
+    question is not asking for a figure about a known metric.
+
+    Only "how much/how many", an explicit year, or "what was the <metric>"
+    count as asking for a figure, and only when nothing but other metrics,
+    "growth", a year or "?" follows the metric. Questions that ask why or
+    how something happened are never routed.
+    """
+    text = question.lower()
+    metrics = []
+    first = None
+    for match in _QUESTION_PATTERN.finditer(text):
+        first = first if first is not None else match.start()
+        phrase = match.group(1)
+        for metric in QUESTION_ALIASES.get(phrase, [_LABEL_TO_METRIC.get(phrase)]):
+            if metric and metric not in metrics:
+                metrics.append(metric)
+    if not metrics:
+        return None
+
+    if _QUALITATIVE.search(text) or not _FIGURE_TAIL.fullmatch(text, first):
+        return None
+    years = [int(year) for year in _YEAR_PATTERN.findall(text)]
+    if not years and not _HOW_MUCH.search(text) and not _WHAT_WAS_METRIC.match(text):
+        return None
+
+    kind = None
+    if _PERCENT_CUES.search(text):
+        kind = KIND_PERCENT
+    elif _MONEY_CUES.search(text):
+        kind = KIND_MONEY
+    return metrics, years, kind
+
+
+class FactIndex:
+    def __init__(self):
+        # Columns, one entry per fact row
+        self.metric = array('B')
+        self.kind = array('B')
+        self.year = array('H')
+        self.value = array('d')
+        self.distance = array('H')
+        self.sentence = array('I')
+        self.chunk = array('I')
+        self.alive = bytearray()
+        self._live = 0
+
+        self.sentences = []
+        self.chunk_ids = []
+        self.chunk_sources = []
+        self._chunk_number = {}
+        self._chunk_rows = {}
+        # (metric, year) -> {(kind, source): set of rows}; year 0 collects facts with no year nearby
+        self._by_metric_year = {}
+        self._years_by_metric = {}
+        # (metric, year, kind) -> {source: row with the closest label}, so lookups never scan
+        self._best = {}
+
+    def __len__(self):
+        return self._live
+
+    def _numbers(self, sentence):
+        for match in _MONEY_PATTERN.finditer(sentence):
+            if match.group(4):
+                whole, fraction, scale = match.group(2), match.group(3), SCALES[match.group(4)]
+            else:
+                whole, fraction, scale = match.group(5), match.group(6), 1.0
+            yield KIND_MONEY, float(whole.replace(",", "") + (fraction or "")) * scale, match.start(), match.end()
+        for match in _PERCENT_PATTERN.finditer(sentence):
+            yield KIND_PERCENT, float(match.group(1)), match.start(), match.end()
+
+    def _source(self, row):
+        return self.chunk_sources[self.chunk[row]]
+
+    def add_chunk(self, chunk_id, text, source=""):
+        """Extract facts from one chunk; returns the number of rows added"""
+        if chunk_id in self._chunk_number:
+            self.remove_chunks([chunk_id])
+        chunk_number = len(self.chunk_ids)
+        self.chunk_ids.append(chunk_id)
+        self.chunk_sources.append(source)
+        self._chunk_number[chunk_id] = chunk_number
+        rows = self._chunk_rows.setdefault(chunk_id, [])
+
+        for sentence in _SENTENCE_SPLIT.split(text):
+            if not _DIGIT.search(sentence):
+                continue
+            lower = sentence.lower()
+            labels = [(match.start(), match.end(), _LABEL_TO_METRIC[match.group(1)])
+                      for match in _LABEL_PATTERN.finditer(lower)]
+            if not labels:
+                continue
+            numbers = list(self._numbers(lower))
+            if not numbers:
+                continue
+            years = [(match.start(), match.end(), int(match.group(1))) for match in _YEAR_PATTERN.finditer(lower)]
+
+            sentence_number = None
+            for kind, value, start, end in numbers:
+                # Nearest label, with labels before the number winning ties
+                distance, metric = min(
+                    (start - label_end if label_end <= start else label_start - end + 1, metric)
+                    for label_start, label_end, metric in labels
+                )
+                # "... $15.1 billion in 2023" - a following year is the usual reading
+                year = min(
+                    years,
+                    key=lambda item: item[0] - end if item[0] >= end else start - item[1] + 1
+                )[2] if years else 0
+                if sentence_number is None:
+                    sentence_number = len(self.sentences)
+                    self.sentences.append(_SECTION_TAG.sub("", sentence.strip()))
+
+                row = len(self.value)
+                self.metric.append(METRICS.index(metric))
+                self.kind.append(kind)
+                self.year.append(year)
+                self.value.append(value)
+                self.distance.append(min(max(distance, 0), 65535))
+                self.sentence.append(sentence_number)
+                self.chunk.append(chunk_number)
+                self.alive.append(1)
+                self._live += 1
+                self._by_metric_year.setdefault((metric, year), {}).setdefault((kind, source), set()).add(row)
+                self._years_by_metric.setdefault(metric, set()).add(year)
+                self._update_best((metric, year, kind), source, row)
+                rows.append(row)
+        return len(rows)
+
+    def _update_best(self, key, source, row):
+        best = self._best.setdefault(key, {})
+        current = best.get(source)
+        if current is None or self.distance[row] < self.distance[current]:
+            best[source] = row
+
+    def remove_chunks(self, chunk_ids):
+        """Drop every fact that came from these chunks"""
+        # (metric, year, kind, source) whose best row went away
+        stale = set()
+        for chunk_id in chunk_ids:
+            self._chunk_number.pop(chunk_id, None)
+            for row in self._chunk_rows.pop(chunk_id, ()):
+                self.alive[row] = 0
+                self._live -= 1
+                metric, year, kind = METRICS[self.metric[row]], self.year[row], self.kind[row]
+                source = self._source(row)
+                groups = self._by_metric_year.get((metric, year))
+                rows = groups.get((kind, source)) if groups is not None else None
+                if rows is not None:
+                    rows.discard(row)
+                    if not rows:
+                        del groups[(kind, source)]
+                    if not groups:
+                        del self._by_metric_year[(metric, year)]
+                        self._years_by_metric[metric].discard(year)
+                if self._best.get((metric, year, kind), {}).get(source) == row:
+                    stale.add((metric, year, kind, source))
+
+        for metric, year, kind, source in stale:
+            best = self._best[(metric, year, kind)]
+            del best[source]
+            for row in self._by_metric_year.get((metric, year), {}).get((kind, source), ()):
+                self._update_best((metric, year, kind), source, row)
+            if not best:
+                del self._best[(metric, year, kind)]
+
+        dead = len(self.alive) - self._live
+        if dead > 1000 and dead > self._live:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the columns without removed rows, sentences and chunks"""
+        old = (self.metric, self.kind, self.year, self.value, self.distance, self.sentence, self.chunk)
+        old_sentences, old_chunk_ids, old_chunk_sources = self.sentences, self.chunk_ids, self.chunk_sources
+        live_rows = [row for row, alive in enumerate(self.alive) if alive]
+        self.__init__()
+
+        sentence_map = {}
+        chunk_map = {}
+        for row in live_rows:
+            metric, kind, year, value, distance, sentence, chunk = (column[row] for column in old)
+            if sentence not in sentence_map:
+                sentence_map[sentence] = len(self.sentences)
+                self.sentences.append(old_sentences[sentence])
+            if chunk not in chunk_map:
+                chunk_map[chunk] = len(self.chunk_ids)
+                self.chunk_ids.append(old_chunk_ids[chunk])
+                self.chunk_sources.append(old_chunk_sources[chunk])
+                self._chunk_number[old_chunk_ids[chunk]] = chunk_map[chunk]
+
+            new_row = len(self.value)
+            for column, item in zip(
+                (self.metric, self.kind, self.year, self.value, self.distance, self.sentence, self.chunk),
+                (metric, kind, year, value, distance, sentence_map[sentence], chunk_map[chunk])
+            ):
+                column.append(item)
+            self.alive.append(1)
+            self._live += 1
+            self._by_metric_year.setdefault((METRICS[metric], year), {}).setdefault(
+                (kind, old_chunk_sources[chunk]), set()).add(new_row)
+            self._years_by_metric.setdefault(METRICS[metric], set()).add(year)
+            self._update_best((METRICS[metric], year, kind), old_chunk_sources[chunk], new_row)
+            self._chunk_rows.setdefault(old_chunk_ids[chunk], []).append(new_row)
+
+    def lookup(self, metric, years=None, kind=None, source=None):
+        """Best live row for metric, or None.
+
+        Each source contributes its best row for the requested years (else
+        its latest year), preferring kind and then the closest label. When
+        sources report different figures there is no single answer, and
+        None is returned; pass source to ask about one filing.
+        """
+        explicit = bool(years)
+        if not explicit:
+            years = sorted(self._years_by_metric.get(metric, ()), reverse=True)
+
+        def rank(row):
+            return kind is not None and self.kind[row] != kind, self.distance[row]
+
+        chosen = {}
+        for year in years:
+            found = {}
+            for row_kind in (KIND_MONEY, KIND_PERCENT):
+                best = self._best.get((metric, year, row_kind), {})
+                if source is not None:
+                    best = {source: best[source]} if source in best else {}
+                for row_source, row in best.items():
+                    # Without a requested year each source answers from its latest one
+                    if not explicit and row_source in chosen:
+                        continue
+                    if row_source not in found or rank(row) < rank(found[row_source]):
+                        found[row_source] = row
+            for row_source, row in found.items():
+                if row_source not in chosen or rank(row) < rank(chosen[row_source]):
+                    chosen[row_source] = row
+        if not chosen:
+            return None
+        if len({(self.year[row], self.kind[row], self.value[row]) for row in chosen.values()}) > 1:
+            return None
+        return min(chosen.values(), key=rank)
+
+    def answer(self, question, source=None):
+        """Return (answer text, fact records) from the table, or None to fall back.
+
+        Each record holds the chunk_id and source the figure came from plus
+        its metric, year, value and kind.
+        """
+        parsed = parse_question(question)
+        if parsed is None:
+            return None
+        metrics, years, kind = parsed
+
+        sentence_numbers = []
+        facts = []
+        for metric in metrics:
+            row = self.lookup(metric, years, kind, source)
+            if row is None:
+                continue
+            if self.sentence[row] not in sentence_numbers:
+                sentence_numbers.append(self.sentence[row])
+                chunk_number = self.chunk[row]
+                facts.append({
+                    "source": self.chunk_sources[chunk_number],
+                    "chunk_id": self.chunk_ids[chunk_number],
+                    "metric": metric,
+                    "year": self.year[row] or None,
+                    "value": self.value[row],
+                    "kind": "percent" if self.kind[row] == KIND_PERCENT else "money",
+                })
+        if not sentence_numbers:
+            return None
+
+        answer = " ".join(self.sentences[number] for number in sentence_numbers)
+        if answer[-1] not in ".!?":
+            answer += "."
+        return answer, facts
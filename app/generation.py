@@ -0,0 +1,210 @@
+import hashlib
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from utils import setup_logging
+
+PROMPT_TEMPLATE = (
+    "Answer the question using only the business document context.\n"
+    "Context: {context}\n"
+    "Question: {question}\n"
+    "Answer:"
+)
+
+
+class ContextPacker:
+    """Fill a prompt's context with the most relevant chunks first, up to a
+    token budget measured with the model's own tokenizer.
+
+    Without a tokenizer, tokens are estimated as characters / 4.
+    """
+
+    def __init__(self, tokenizer=None, max_input_tokens=512, min_fragment_tokens=32):
+        self.tokenizer = tokenizer
+        self.max_input_tokens = max_input_tokens
+        self.min_fragment_tokens = min_fragment_tokens
+
+    def count_tokens(self, text):
+        if self.tokenizer is None:
+            return (len(text) + 3) // 4
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def _truncate(self, text, num_tokens):
+        if self.tokenizer is None:
+            return text[:num_tokens * 4]
+        ids = self.tokenizer.encode(text, add_special_tokens=False)[:num_tokens]
+        return self.tokenizer.decode(ids, skip_special_tokens=True)
+
+    def budget_for(self, question):
+        """Tokens left for context once the prompt and question are accounted for"""
+        overhead = self.count_tokens(PROMPT_TEMPLATE.format(context="", question=question))
+        # Room for the end-of-sequence token and separators between chunks
+        return max(self.max_input_tokens - overhead - 8, 0)
+
+    def pack(self, docs, question=""):
+        """Join docs (already in relevance order) until the budget is used up"""
+        budget = self.budget_for(question)
+        parts = []
+        used = 0
+        for doc in docs:
+            tokens = self.count_tokens(doc)
+            if used + tokens <= budget:
+                parts.append(doc)
+                used += tokens
+                continue
+            remaining = budget - used
+            if remaining >= self.min_fragment_tokens:
+                parts.append(self._truncate(doc, remaining))
+            break
+        return " ".join(parts)
+
+
+class GenerationService:
+    """Coalesces concurrent generate() calls into padded batches for a
+    seq2seq model and caches outputs by (question, context hash).
+
+    A single worker thread owns the model. Callers block on a Future; the
+    worker waits up to max_wait_ms for more requests before running a batch.
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size=8, max_wait_ms=10,
+                 max_input_tokens=512, max_new_tokens=128, cache_size=256):
+        self.logger = setup_logging()
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_input_tokens = max_input_tokens
+        self.max_new_tokens = max_new_tokens
+        self.cache_size = cache_size
+
+        self._cache = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._closed = False
+        self.stats = {
+            "requests": 0,
+            "cache_hits": 0,
+            "deduplicated": 0,
+            "batches": 0,
+            "batched_requests": 0,
+            "generated_tokens": 0,
+            "generation_seconds": 0.0,
+        }
+
+        self._worker = threading.Thread(target=self._run, name="generation-batcher", daemon=True)
+        self._worker.start()
+
+    @staticmethod
+    def cache_key(question, context):
+        return question.strip().lower(), hashlib.sha1(context.encode("utf-8")).hexdigest()
+
+    def submit(self, question, context):
+        """Queue a request and return a Future for the answer text"""
+        key = self.cache_key(question, context)
+        with self._lock:
+            self.stats["requests"] += 1
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                future = Future()
+                future.set_result(self._cache[key])
+                return future
+            # Identical questions already waiting share one generation
+            if key in self._in_flight:
+                self.stats["deduplicated"] += 1
+                return self._in_flight[key]
+            if self._closed:
+                raise RuntimeError("GenerationService is closed")
+            future = Future()
+            self._in_flight[key] = future
+            # Queued under the lock so it always lands ahead of close()'s sentinel
+            prompt = PROMPT_TEMPLATE.format(context=context, question=question)
+            self._queue.put((key, prompt, future))
+        return future
+
+    def generate(self, question, context, timeout=None):
+        return self.submit(question, context).result(timeout=timeout)
+
+    def _collect_batch(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                return
+            try:
+                answers = self._generate_batch([prompt for _, prompt, _ in batch])
+            except Exception as e:
+                self.logger.error(f"❌ Generation error: {e}")
+                with self._lock:
+                    for key, _, future in batch:
+                        self._in_flight.pop(key, None)
+                        future.set_exception(e)
+                continue
+
+            with self._lock:
+                for (key, _, future), answer in zip(batch, answers):
+                    self._in_flight.pop(key, None)
+                    self._cache[key] = answer
+                    future.set_result(answer)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+    def _generate_batch(self, prompts):
+        import torch
+
+        start = time.perf_counter()
+        inputs = self.tokenizer(
+            prompts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_input_tokens,
+            return_tensors="pt"
+        )
+        with torch.no_grad():
+            outputs = self.model.generate(**inputs, max_new_tokens=self.max_new_tokens)
+        answers = self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+        pad_id = self.tokenizer.pad_token_id
+        generated = int((outputs != pad_id).sum()) if pad_id is not None else outputs.numel()
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["batched_requests"] += len(prompts)
+            self.stats["generated_tokens"] += generated
+            self.stats["generation_seconds"] += time.perf_counter() - start
+        return [answer.strip() for answer in answers]
+
+    def tokens_per_second(self):
+        seconds = self.stats["generation_seconds"]
+        return self.stats["generated_tokens"] / seconds if seconds else 0.0
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._worker.join(timeout=5)
@@ -2,11 +2,9 @@ import streamlit as st
 import os
 import tempfile
 
-from document_processor import DocumentProcessor
-from multimodal_processor import MultimodalProcessor
-from rag_engine import RAGEngine
-from visualizer import create_simple_chart
 from evaluator import Evaluator
+from profiling import get_profiler
+from utils import warm_up
 
 
 st.markdown("""
@@ -40,6 +38,27 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Heavy modules (torch, transformers, langchain, chromadb, matplotlib) are
+# imported only by the code paths that need them, on first use.
+
+def get_doc_processor():
+    if 'doc_processor' not in st.session_state:
+        from document_processor import DocumentProcessor
+        st.session_state.doc_processor = DocumentProcessor()
+    return st.session_state.doc_processor
+
+def get_multimodal_processor():
+    if 'multimodal_processor' not in st.session_state:
+        from multimodal_processor import MultimodalProcessor
+        st.session_state.multimodal_processor = MultimodalProcessor()
+    return st.session_state.multimodal_processor
+
+def get_rag_engine():
+    if 'rag_engine' not in st.session_state:
+        from rag_engine import RAGEngine
+        st.session_state.rag_engine = RAGEngine()
+    return st.session_state.rag_engine
+
 def main():
     st.set_page_config(
         page_title="Business AI Assistant",
@@ -51,10 +70,7 @@ def main():
     st.write("Upload your business documents and get AI-powered insights")
     
    
-    if 'doc_processor' not in st.session_state:
-        st.session_state.doc_processor = DocumentProcessor()
-        st.session_state.multimodal_processor = MultimodalProcessor()
-        st.session_state.rag_engine = RAGEngine()
+    if 'evaluator' not in st.session_state:
         st.session_state.evaluator = Evaluator()
         st.session_state.all_text = ""
         st.session_state.insights = []
@@ -70,13 +86,25 @@ def main():
             accept_multiple_files=True
         )
         
-        uploaded_image = st.file_uploader(
+        uploaded_images = st.file_uploader(
             "Business Images",
-            type=['jpg', 'jpeg', 'png']
+            type=['jpg', 'jpeg', 'png'],
+            accept_multiple_files=True
         )
         
         if st.button("🚀 Process Files"):
-            process_files(uploaded_docs, uploaded_image)
+            process_files(uploaded_docs, uploaded_images)
+        
+       
+        with st.expander("🔥 Profiling"):
+            profiler = get_profiler()
+            enabled = st.checkbox("Profile requests", value=profiler.enabled)
+            sample_rate = st.slider("Sample rate", 0.0, 1.0, float(profiler.sample_rate), 0.05)
+            threshold_ms = st.number_input("Always keep requests slower than (ms, 0 = off)",
+                                           min_value=0, value=int(profiler.threshold_ms), step=250)
+            profiler.configure(enabled=enabled, sample_rate=sample_rate, threshold_ms=threshold_ms)
+            if enabled:
+                st.caption(f"Flamegraph files go to {profiler.output_dir}")
         
        
         if hasattr(st.session_state, 'processed_files'):
@@ -94,9 +122,15 @@ def main():
         show_insights()
     with tab3:
         show_actions()
+    
+    # Page is painted; optionally load models in the background so the first
+    # question is quick. The LLM is only worth loading when generation is on.
+    if os.environ.get("BIZ_WARMUP", "0").lower() in ("1", "true", "yes") and 'warmup_started' not in st.session_state:
+        st.session_state.warmup_started = True
+        warm_up(include_llm=get_rag_engine().enable_generation)
 
-def process_files(uploaded_docs, uploaded_image):
-    if not uploaded_docs and not uploaded_image:
+def process_files(uploaded_docs, uploaded_images):
+    if not uploaded_docs and not uploaded_images:
         st.sidebar.warning("Please upload files first")
         return
     
@@ -111,19 +145,19 @@ def process_files(uploaded_docs, uploaded_image):
                 tmp_path = tmp_file.name
             
            
-            chunks = st.session_state.doc_processor.process_business_document(tmp_path)
+            chunks = get_doc_processor().process_business_document(tmp_path, source=doc.name)
             
             if chunks:
-                for chunk in chunks:
-                    st.session_state.rag_engine.add_document(chunk, doc.name)
-                    all_text.append(chunk)
+                # One embedding batch and one retention pass per file
+                get_rag_engine().add_documents([(chunk.text, doc.name, chunk.metadata()) for chunk in chunks])
+                all_text.extend(chunk.text for chunk in chunks)
                 processed_files.append(f"{doc.name} ({len(chunks)} chunks)")
                 st.sidebar.success(f"✅ {doc.name}")
             else:
                 
-                content = st.session_state.doc_processor.process_file(tmp_path)
+                content = get_doc_processor().process_file(tmp_path)
                 if content:
-                    st.session_state.rag_engine.add_document(content, doc.name)
+                    get_rag_engine().add_document(content, doc.name)
                     all_text.append(content)
                     processed_files.append(f"{doc.name} (processed)")
                     st.sidebar.success(f"✅ {doc.name}")
@@ -133,17 +167,16 @@ def process_files(uploaded_docs, uploaded_image):
             os.unlink(tmp_path)
             progress_bar.progress((i + 1) / len(uploaded_docs))
     
-    if uploaded_image:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=uploaded_image.name) as tmp_file:
-            tmp_file.write(uploaded_image.getvalue())
-            tmp_path = tmp_file.name
-        
-        analysis = st.session_state.multimodal_processor.analyze_image(tmp_path)
-        st.session_state.image_analysis = analysis
-        processed_files.append(f"{uploaded_image.name} (image analysis)")
-        st.sidebar.success("✅ Image analyzed")
-        
-        os.unlink(tmp_path)
+    if uploaded_images:
+        processor = get_multimodal_processor()
+        results = processor.analyze_images([image.getvalue() for image in uploaded_images])
+        st.session_state.image_analysis = {
+            image.name: processor.describe_image_analysis(result)
+            for image, result in zip(uploaded_images, results)
+        }
+        for image in uploaded_images:
+            processed_files.append(f"{image.name} (image analysis)")
+        st.sidebar.success(f"✅ {len(uploaded_images)} image(s) analyzed")
     
     if all_text:
         st.session_state.all_text = "\n".join(all_text)
@@ -184,7 +217,7 @@ def show_chat():
     
     if st.button("🔍 Get Answer", type="primary") and question:
         with st.spinner("🔍 Searching documents..."):
-            answer = st.session_state.rag_engine.answer_question(question)
+            answer = get_rag_engine().answer_question(question)
             st.session_state.evaluator.log_query()
             
            
@@ -213,7 +246,7 @@ def show_insights():
             st.warning("⚠️ Please upload documents first")
         else:
             with st.spinner("Analyzing documents for insights..."):
-                insights = st.session_state.multimodal_processor.generate_ai_insights(st.session_state.all_text)
+                insights = get_multimodal_processor().generate_ai_insights(st.session_state.all_text)
                 st.session_state.insights = insights
                 
                 if insights:
@@ -222,6 +255,7 @@ def show_insights():
                         st.markdown(f"**{i}.** {insight}")
                    
                     try:
+                        from visualizer import create_simple_chart
                         chart = create_simple_chart(insights, st.session_state.all_text)
                         st.image(chart, use_column_width=True, caption="📈 Insights Visualization")
                     except Exception as e:
@@ -237,7 +271,7 @@ def show_actions():
             st.warning("⚠️ Please generate insights first")
         else:
             with st.spinner("Creating actionable plan..."):
-                actions = st.session_state.multimodal_processor.create_action_plan(st.session_state.insights)
+                actions = get_multimodal_processor().create_action_plan(st.session_state.insights)
                 
                 if actions:
                     st.success("🎯 Your Action Plan:")
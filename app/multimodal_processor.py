@@ -1,11 +1,22 @@
+import hashlib
+import io
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 from PIL import Image
 
 from utils import setup_logging
 
+ANALYSIS_SIZE = (256, 256)
+IMAGE_CACHE_SIZE = 512
+
 class MultimodalProcessor:
     def __init__(self):
         self.logger = setup_logging()
         self.image_model_loaded = False
+        self._image_cache = OrderedDict()
         
         
         try:
@@ -41,6 +52,160 @@ class MultimodalProcessor:
         except Exception as e:
             return f"Could not analyze image: {str(e)}"
     
+    def _load_image_bytes(self, image):
+        """Accept a file path or raw bytes and return the bytes"""
+        if isinstance(image, (bytes, bytearray)):
+            return bytes(image)
+        with open(image, 'rb') as file:
+            return file.read()
+
+    def _decode_small(self, data):
+        """Decode at reduced resolution; JPEG draft mode skips most of the IDCT work"""
+        image = Image.open(io.BytesIO(data))
+        original_size = image.size
+        image_format = image.format
+        mode = image.mode
+        image.draft("RGB", ANALYSIS_SIZE)
+        image.thumbnail(ANALYSIS_SIZE)
+        pixels = np.asarray(image.convert("RGB"), dtype=np.uint8)
+        return pixels, original_size, image_format, mode
+
+    def _image_features(self, pixels):
+        """Vectorized color, edge, grid and text-region features for an RGB array"""
+        height, width, _ = pixels.shape
+        total = height * width
+
+        # 4 levels per channel -> 64-bin joint color histogram
+        quantized = pixels >> 6
+        bins = (quantized[..., 0].astype(np.int32) << 4) | (quantized[..., 1] << 2) | quantized[..., 2]
+        histogram = np.bincount(bins.ravel(), minlength=64) / total
+
+        top_bins = np.argsort(histogram)[::-1][:3]
+        dominant_colors = []
+        for b in top_bins:
+            if histogram[b] <= 0:
+                continue
+            r, g, bl = ((b >> 4) & 3) * 64 + 32, ((b >> 2) & 3) * 64 + 32, (b & 3) * 64 + 32
+            dominant_colors.append({"color": f"#{r:02x}{g:02x}{bl:02x}", "share": round(float(histogram[b]), 3)})
+
+        gray = pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+        gx = np.abs(np.diff(gray, axis=1))
+        gy = np.abs(np.diff(gray, axis=0))
+        edges_x = gx > 40
+        edges_y = gy > 40
+        edge_density = (edges_x.sum() + edges_y.sum()) / max(edges_x.size + edges_y.size, 1)
+
+        # Long straight lines spanning most of the image are axes or table rules;
+        # thin rules fade when downscaled, so they get a lower contrast threshold
+        horizontal_lines = int(((gy > 12).mean(axis=1) > 0.5).sum()) if gy.size else 0
+        vertical_lines = int(((gx > 12).mean(axis=0) > 0.5).sum()) if gx.size else 0
+        grid_density = (horizontal_lines + vertical_lines) / max(height + width, 1)
+
+        # Text shows up as 8x8 blocks with dense but not solid edges
+        block = 8
+        bh, bw = (height - 1) // block, (width - 1) // block
+        text_region_ratio = 0.0
+        if bh and bw:
+            edge_map = edges_x[:bh * block, :bw * block] | edges_y[:bh * block, :bw * block]
+            block_density = edge_map.reshape(bh, block, bw, block).mean(axis=(1, 3))
+            text_region_ratio = float(((block_density > 0.15) & (block_density < 0.6)).mean())
+
+        colorfulness = float(np.std(pixels.astype(np.int16)[..., 0] - pixels[..., 1]) +
+                             np.std(pixels.astype(np.int16)[..., 1] - pixels[..., 2]))
+        colors_used = int((histogram > 0.01).sum())
+
+        return {
+            "color_histogram": histogram.round(4).tolist(),
+            "dominant_colors": dominant_colors,
+            "edge_density": round(float(edge_density), 4),
+            "grid_density": round(float(grid_density), 4),
+            "horizontal_lines": horizontal_lines,
+            "vertical_lines": vertical_lines,
+            "text_region_ratio": round(text_region_ratio, 4),
+            "colors_used": colors_used,
+            "colorfulness": round(colorfulness, 2),
+        }
+
+    def _classify_visual(self, features):
+        """Rough guess at what kind of business visual this is"""
+        if features["grid_density"] > 0.05 and features["colors_used"] <= 4:
+            return "table or spreadsheet"
+        if features["text_region_ratio"] > 0.3 and features["colors_used"] <= 4:
+            return "text document or report page"
+        if features["vertical_lines"] + features["horizontal_lines"] >= 2 and features["colors_used"] > 3:
+            return "chart (bar or line)"
+        if features["colors_used"] > 6 and features["edge_density"] < 0.1:
+            return "chart (pie or area)"
+        if features["colorfulness"] > 40:
+            return "dashboard or photo"
+        return "unknown"
+
+    def _analyze_image_bytes(self, data):
+        pixels, (width, height), image_format, mode = self._decode_small(data)
+        features = self._image_features(pixels)
+        features.update({
+            "width": width,
+            "height": height,
+            "format": image_format,
+            "mode": mode,
+            "orientation": "landscape" if width > height else "portrait",
+        })
+        features["visual_type"] = self._classify_visual(features)
+        return features
+
+    def _cached_analysis(self, digest):
+        result = self._image_cache.get(digest)
+        if result is not None:
+            self._image_cache.move_to_end(digest)
+        return result
+
+    def analyze_images(self, images, max_workers=None):
+        """Analyze many images (paths or bytes) concurrently.
+
+        Results come back in input order and are cached by content hash, so
+        re-uploading the same screenshot is free.
+        """
+        payloads = [self._load_image_bytes(image) for image in images]
+        digests = [hashlib.sha1(data).hexdigest() for data in payloads]
+
+        results = [self._cached_analysis(digest) for digest in digests]
+        pending = {}
+        for i, digest in enumerate(digests):
+            if results[i] is None and digest not in pending:
+                pending[digest] = payloads[i]
+
+        def run(data):
+            try:
+                return self._analyze_image_bytes(data)
+            except Exception as e:
+                return {"error": f"Could not analyze image: {str(e)}"}
+
+        if pending:
+            workers = max_workers or min(len(pending), os.cpu_count() or 4)
+            # Pillow and NumPy release the GIL for decoding and array math
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                computed = dict(zip(pending, pool.map(run, pending.values())))
+            for digest, result in computed.items():
+                result["hash"] = digest
+                if "error" not in result:
+                    self._image_cache[digest] = result
+            while len(self._image_cache) > IMAGE_CACHE_SIZE:
+                self._image_cache.popitem(last=False)
+            results = [r if r is not None else computed[d] for r, d in zip(results, digests)]
+
+        self.logger.info(f"Analyzed {len(images)} images ({len(pending)} decoded, {len(images) - len(pending)} cached)")
+        # Copies, so a caller editing a result cannot change the cached entry
+        return [dict(result) for result in results]
+
+    def describe_image_analysis(self, result):
+        """One-line, human readable summary of an analyze_images result"""
+        if "error" in result:
+            return result["error"]
+        colors = ", ".join(c["color"] for c in result["dominant_colors"])
+        return (f"{result['width']}x{result['height']} {result['orientation']} image, likely a "
+                f"{result['visual_type']} (dominant colors {colors}; "
+                f"{result['text_region_ratio']:.0%} text-like regions).")
+
     def generate_ai_insights(self, text):
         """Better insights using simple AI techniques"""
        
@@ -0,0 +1,205 @@
+"""On-demand profiling for slow requests and memory-hungry ingestion.
+
+Off by default. Turn it on with environment variables (or the sidebar toggle):
+    BIZ_PROFILE=1                  enable profiling
+    BIZ_PROFILE_SAMPLE_RATE=0.05   profile this fraction of requests (default 0)
+    BIZ_PROFILE_THRESHOLD_MS=1000  keep any request slower than this (default 1000, 0 = off)
+    BIZ_PROFILE_INTERVAL_MS=5      stack sampling interval
+    BIZ_PROFILE_DIR=./profiles     where profiles are written
+
+CPU profiles are written in folded-stack format ("frame;frame;frame count"),
+which flamegraph.pl, speedscope and inferno read directly. Every thread is
+sampled and each stack starts with its thread's name, so work handed to the
+generation-batcher shows up next to the request waiting on it. Each profile
+has a .json sidecar with the query, document set and timing.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from utils import setup_logging
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+class StackSampler:
+    """Statistical profiler: a background thread periodically records the
+    Python stack of every other thread, so the profiled code runs untouched.
+
+    Stacks are rooted at "thread:<name>". samples counts the ticks on which
+    the target thread was running.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_id not in frames:
+                continue
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                name = thread_names.get(ident, str(ident))
+                # Skip this sampler and any sampler of a concurrent request
+                if name == "stack-sampler":
+                    continue
+                names = []
+                while frame is not None:
+                    names.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                names.append(f"thread:{name}".replace(";", ":"))
+                self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+class Profiler:
+    def __init__(self):
+        self.logger = setup_logging()
+        self.configure(
+            enabled=os.environ.get("BIZ_PROFILE", "0").lower() in ("1", "true", "yes"),
+            sample_rate=float(os.environ.get("BIZ_PROFILE_SAMPLE_RATE", "0")),
+            threshold_ms=float(os.environ.get("BIZ_PROFILE_THRESHOLD_MS", "1000")),
+            interval_ms=float(os.environ.get("BIZ_PROFILE_INTERVAL_MS", "5")),
+            output_dir=os.environ.get("BIZ_PROFILE_DIR", "./profiles"),
+        )
+
+    def configure(self, enabled=None, sample_rate=None, threshold_ms=None, interval_ms=None, output_dir=None):
+        """Change settings at runtime; arguments left as None keep their value"""
+        if enabled is not None:
+            self.enabled = enabled
+        if sample_rate is not None:
+            self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        if threshold_ms is not None:
+            self.threshold_ms = threshold_ms
+        if interval_ms is not None:
+            self.interval_ms = interval_ms
+        if output_dir is not None:
+            self.output_dir = output_dir
+
+    def _write(self, kind, name, tags, lines, extra):
+        if callable(tags):
+            tags = tags()
+        tags = tags or {}
+        os.makedirs(self.output_dir, exist_ok=True)
+        tag_hash = hashlib.sha1(json.dumps(tags, sort_keys=True, default=str).encode()).hexdigest()[:8]
+        slug = re.sub(r"[^A-Za-z0-9_-]+", "-", name)
+        # The random suffix keeps two profiles of one query in the same second apart
+        base = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{tag_hash}-"
+                                             f"{uuid.uuid4().hex[:6]}.{kind}")
+
+        with open(base + ".folded", "w", encoding="utf-8") as file:
+            file.writelines(f"{stack} {count}\n" for stack, count in lines)
+        with open(base + ".json", "w", encoding="utf-8") as file:
+            json.dump({"name": name, "kind": kind, "tags": tags, **extra}, file, indent=2, default=str)
+        self.logger.info(f"🔥 Wrote {kind} profile {base}.folded")
+        return base + ".folded"
+
+    @contextmanager
+    def profile_request(self, name, tags=None):
+        """Sample thread stacks while the block runs.
+
+        A profile is kept if the request was picked by sample_rate or took
+        longer than threshold_ms. tags may be a function returning the dict,
+        so it is only built when a profile is actually written.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        picked = random.random() < self.sample_rate
+        if not picked and self.threshold_ms <= 0:
+            yield
+            return
+
+        sampler = StackSampler(threading.get_ident(), self.interval_ms / 1000).start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stacks = sampler.stop()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            slow = self.threshold_ms > 0 and elapsed_ms >= self.threshold_ms
+            if (picked or slow) and stacks:
+                self._write("cpu", name, tags, stacks.most_common(), {
+                    "duration_ms": round(elapsed_ms, 2),
+                    "samples": sampler.samples,
+                    "interval_ms": self.interval_ms,
+                    "reason": "slow" if slow else "sampled",
+                })
+
+    @contextmanager
+    def trace_memory(self, name, tags=None, frames=25):
+        """Record allocations made inside the block with tracemalloc.
+
+        The folded output weights each allocation traceback by bytes still
+        held at the end of the block, so it renders as a memory flamegraph.
+        """
+        if not self.enabled or tracemalloc.is_tracing():
+            yield
+            return
+
+        tracemalloc.start(frames)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            snapshot = snapshot.filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ])
+            lines = []
+            for stat in snapshot.statistics("traceback"):
+                stack = ";".join(
+                    f"{os.path.basename(frame.filename)}:{frame.lineno}".replace(";", ":")
+                    for frame in stat.traceback
+                )
+                lines.append((stack, stat.size))
+            self._write("memory", name, tags, lines, {
+                "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                "current_bytes": current,
+                "peak_bytes": peak,
+            })
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler():
+    """Process-wide profiler, configured from the environment on first use"""
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = Profiler()
+    return _profiler
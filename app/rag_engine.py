@@ -1,67 +1,393 @@
-from langchain.vectorstores import Chroma
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.schema import Document as LangchainDoc
-from transformers import pipeline
+import json
+import os
 import re
+import sqlite3
+import threading
+import time
+import uuid
 
-from utils import setup_logging
+from fact_index import FactIndex
+from generation import ContextPacker, GenerationService
+from profiling import get_profiler
+from utils import setup_logging, load_embeddings, load_llm
+
+# Chunk id -> last retrieval time, kept next to the index so LRU eviction
+# survives restarts (every CLI run is a fresh process)
+RETRIEVAL_FILE = "last_retrieved.json"
+RETRIEVAL_SAVE_SECONDS = 30
+# Name a collection is rebuilt under by compact_collection before the swap
+COMPACT_SUFFIX = "__compacting"
+
+
+class RetentionPolicy:
+    """Limits on what the index keeps. None means no limit.
+
+    ttl_seconds applies to every source unless source_ttls overrides it.
+    When max_chunks or max_bytes is exceeded, the least recently retrieved
+    chunks are evicted first.
+    """
+
+    def __init__(self, max_chunks=None, max_bytes=None, ttl_seconds=None, source_ttls=None):
+        self.max_chunks = max_chunks
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.source_ttls = source_ttls or {}
+
+    def ttl_for(self, source):
+        return self.source_ttls.get(source, self.ttl_seconds)
+
+    @property
+    def unlimited(self):
+        return (self.max_chunks is None and self.max_bytes is None and
+                self.ttl_seconds is None and not self.source_ttls)
 
 
 class RAGEngine:
-    def __init__(self):
+    def __init__(self, enable_generation=False, persist_directory="./chroma_db",
+                 retention=None, embedding_function=None, num_shards=1, shard_by=None):
         self.logger = setup_logging()
-        self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        self.persist_directory = persist_directory
+        self.num_shards = num_shards
+        self.shard_by = shard_by
+        self.retention = retention or RetentionPolicy()
+        self.embedding_function = embedding_function
         self.vector_store = None
-        self.documents = []
+        # chunk id -> {"source", "content", "bytes", "added_at", "last_retrieved"}
+        self.chunk_index = {}
+        self.source_chunks = {}
+        self.total_bytes = 0
+        self.fact_index = FactIndex()
+        self._index_lock = threading.Lock()
+        self._retrieval_lock = threading.Lock()
+        self._retrieval_dirty = False
+        self._retrieval_saved_at = time.time()
+        self.profiler = get_profiler()
+        self.context_packer = ContextPacker()
+        self.generator = None
+        self.enable_generation = enable_generation
+        self.llm_available = False
+        self._llm_loaded = False
+        self._llm_lock = threading.Lock()
 
-       
-        try:
-            self.llm = pipeline(
-                "text2text-generation",
-                model="google/flan-t5-small",   
-                max_length=300,
-                truncation=True
+    @property
+    def embeddings(self):
+        return self.embedding_function or load_embeddings()
+
+    @property
+    def documents(self):
+        return [record["content"] for record in self.chunk_index.values()]
+
+    @property
+    def sources(self):
+        return set(self.source_chunks)
+
+    def _ensure_llm(self):
+        """Load Flan-T5 on first use instead of at construction time.
+
+        Concurrent first callers wait for the load, so none of them runs with
+        the fallback packer or without the generator.
+        """
+        if self._llm_loaded:
+            return
+        with self._llm_lock:
+            if self._llm_loaded:
+                return
+            try:
+                self.llm = load_llm()
+                self.context_packer = ContextPacker(
+                    self.llm.tokenizer,
+                    max_input_tokens=self.llm.tokenizer.model_max_length
+                )
+                self.llm_available = self.enable_generation
+                if self.enable_generation:
+                    self.generator = GenerationService(
+                        self.llm.model,
+                        self.llm.tokenizer,
+                        max_input_tokens=self.context_packer.max_input_tokens
+                    )
+                    self.logger.info("✅ Flan-T5 Small loaded with batched generation")
+                else:
+                    self.logger.info("✅ Flan-T5 Small loaded but DISABLED to prevent gibberish")
+            except Exception as e:
+                self.llm_available = False
+                self.logger.warning(f"⚠️ LLM not available, using safe fallback: {e}")
+            finally:
+                self._llm_loaded = True
+
+    def load_persisted(self):
+        """Reopen the vector store left in persist_directory by an earlier run"""
+        if self.vector_store is not None or not os.path.isdir(self.persist_directory):
+            return 0
+
+        from sharded_index import ShardedIndex
+
+        if self.num_shards > 1 or ShardedIndex.exists(self.persist_directory):
+            self.vector_store = self._open_sharded_index()
+        else:
+            import chromadb
+            from chromadb.config import Settings
+            from langchain.vectorstores import Chroma
+
+            # Same settings langchain builds from persist_directory, so the
+            # client is shared with any later Chroma wrapper on this path
+            client = chromadb.Client(Settings(is_persistent=True, persist_directory=self.persist_directory))
+            recover_compaction(client, Chroma._LANGCHAIN_DEFAULT_COLLECTION_NAME)
+            self.vector_store = Chroma(
+                client=client,
+                persist_directory=self.persist_directory,
+                embedding_function=self.embeddings
             )
-            self.llm_available = False  
-            self.logger.info("✅ Flan-T5 Small loaded but DISABLED to prevent gibberish")
-        except Exception as e:
-            self.llm_available = False
-            self.logger.warning(f"⚠️ LLM not available, using safe fallback: {e}")
+        stored = self.vector_store.get(include=["metadatas", "documents"])
+        now = time.time()
+        for chunk_id, content, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+            metadata = metadata or {}
+            self._index_chunk(chunk_id, content, metadata.get("source", ""), metadata.get("added_at", now))
+        self._load_retrieval_times()
+        self.logger.info(f"📂 Reopened vector store with {len(stored['ids'])} chunks")
+        self.enforce_retention()
+        return len(stored["ids"])
 
-    def add_document(self, content, source=""):
-        """Add a document to our knowledge base"""
-        if not content.strip():
+    def _load_retrieval_times(self):
+        path = os.path.join(self.persist_directory, RETRIEVAL_FILE)
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, encoding='utf-8') as file:
+                times = json.load(file)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"⚠️ Ignoring unreadable {path}: {e}")
             return
+        with self._index_lock:
+            for chunk_id, last_retrieved in times.items():
+                record = self.chunk_index.get(chunk_id)
+                if record is not None and last_retrieved > record["last_retrieved"]:
+                    record["last_retrieved"] = last_retrieved
 
-        doc = LangchainDoc(
-            page_content=content,
-            metadata={"source": source}
-        )
+    def save_retrieval_times(self):
+        """Write last-retrieved times of chunks that have been retrieved to RETRIEVAL_FILE"""
+        with self._retrieval_lock:
+            if not self._retrieval_dirty:
+                return
+            with self._index_lock:
+                times = {chunk_id: record["last_retrieved"] for chunk_id, record in self.chunk_index.items()
+                         if record["last_retrieved"] > record["added_at"]}
+                self._retrieval_dirty = False
+                self._retrieval_saved_at = time.time()
+            os.makedirs(self.persist_directory, exist_ok=True)
+            path = os.path.join(self.persist_directory, RETRIEVAL_FILE)
+            with open(path + ".tmp", "w", encoding='utf-8') as file:
+                json.dump(times, file)
+            os.replace(path + ".tmp", path)
+
+    def _mark_retrieved(self, chunk_ids):
+        """Record that chunks were used to answer, for LRU eviction"""
+        now = time.time()
+        touched = False
+        for chunk_id in chunk_ids:
+            record = self.chunk_index.get(chunk_id)
+            if record is not None:
+                record["last_retrieved"] = now
+                touched = True
+        if touched:
+            self._retrieval_dirty = True
+            if now - self._retrieval_saved_at >= RETRIEVAL_SAVE_SECONDS:
+                self.save_retrieval_times()
+
+    def _index_chunk(self, chunk_id, content, source, added_at):
+        size = len(content.encode("utf-8"))
+        with self._index_lock:
+            self.chunk_index[chunk_id] = {
+                "source": source,
+                "content": content,
+                "bytes": size,
+                "added_at": added_at,
+                "last_retrieved": added_at,
+            }
+            self.source_chunks.setdefault(source, set()).add(chunk_id)
+            self.total_bytes += size
+            self.fact_index.add_chunk(chunk_id, content, source)
+
+    def add_documents(self, items):
+        """Add many (content, source, metadata) items with one embedding batch"""
+        from langchain.schema import Document as LangchainDoc
+        from langchain.vectorstores import Chroma
+
+        now = time.time()
+        docs = []
+        ids = []
+        for content, source, metadata in items:
+            if not content.strip():
+                continue
+            chunk_id = uuid.uuid4().hex
+            docs.append(LangchainDoc(
+                page_content=content,
+                metadata={**(metadata or {}), "source": source, "chunk_id": chunk_id, "added_at": now}
+            ))
+            ids.append(chunk_id)
+        if not docs:
+            return
+
+        if self.vector_store is None:
+            # Picks up chunks (and any interrupted compaction) from an earlier run
+            self.load_persisted()
+        if self.vector_store is None and self.num_shards > 1:
+            self.vector_store = self._open_sharded_index()
 
         if self.vector_store is None:
             self.vector_store = Chroma.from_documents(
-                [doc],
+                docs,
                 self.embeddings,
-                persist_directory="./chroma_db"
+                ids=ids,
+                persist_directory=self.persist_directory
             )
         else:
-            self.vector_store.add_documents([doc])
+            self.vector_store.add_documents(docs, ids=ids)
 
-        self.documents.append(content)
-        self.logger.info(f"📄 Added document from {source}")
+        for chunk_id, doc in zip(ids, docs):
+            self._index_chunk(chunk_id, doc.page_content, doc.metadata["source"], now)
+        self.logger.info(f"📄 Added {len(docs)} chunks from {len({doc.metadata['source'] for doc in docs})} source(s)")
+        self.enforce_retention()
 
-    def search(self, query, num_results=3):
-        """Search for relevant information"""
+    def add_document(self, content, source="", metadata=None):
+        """Add a document to our knowledge base"""
+        self.add_documents([(content, source, metadata)])
+
+    def remove_chunks(self, chunk_ids):
+        """Delete chunks from the vector store and every in-memory structure"""
+        chunk_ids = [chunk_id for chunk_id in chunk_ids if chunk_id in self.chunk_index]
+        if not chunk_ids or self.vector_store is None:
+            return 0
+
+        self.vector_store.delete(ids=chunk_ids)
+        with self._index_lock:
+            for chunk_id in chunk_ids:
+                record = self.chunk_index.pop(chunk_id)
+                self.total_bytes -= record["bytes"]
+                source_ids = self.source_chunks.get(record["source"])
+                if source_ids is not None:
+                    source_ids.discard(chunk_id)
+                    if not source_ids:
+                        del self.source_chunks[record["source"]]
+            self.fact_index.remove_chunks(chunk_ids)
+        return len(chunk_ids)
+
+    def remove_source(self, source):
+        """Delete every chunk that came from source"""
+        if self.vector_store is None:
+            return 0
+        removed = self.remove_chunks(list(self.source_chunks.get(source, ())))
+        # Chunks written by a run that crashed before they were indexed here
+        stray = self.vector_store.get(where={"source": source}, include=[])["ids"]
+        if stray:
+            self.vector_store.delete(ids=stray)
+        return removed
+
+    def enforce_retention(self, now=None):
+        """Drop expired chunks, then least recently retrieved ones until within capacity"""
+        policy = self.retention
+        if policy.unlimited:
+            return 0
+        now = now or time.time()
+
+        expired = []
+        for chunk_id, record in self.chunk_index.items():
+            ttl = policy.ttl_for(record["source"])
+            if ttl is not None and now - record["added_at"] > ttl:
+                expired.append(chunk_id)
+        evicted = self.remove_chunks(expired)
+
+        over_chunks = policy.max_chunks is not None and len(self.chunk_index) > policy.max_chunks
+        over_bytes = policy.max_bytes is not None and self.total_bytes > policy.max_bytes
+        if over_chunks or over_bytes:
+            by_recency = sorted(self.chunk_index.items(), key=lambda item: item[1]["last_retrieved"])
+            victims = []
+            count, size = len(self.chunk_index), self.total_bytes
+            for chunk_id, record in by_recency:
+                if ((policy.max_chunks is None or count <= policy.max_chunks) and
+                        (policy.max_bytes is None or size <= policy.max_bytes)):
+                    break
+                victims.append(chunk_id)
+                count -= 1
+                size -= record["bytes"]
+            evicted += self.remove_chunks(victims)
+
+        if evicted:
+            self.logger.info(f"🧹 Evicted {evicted} chunks ({len(expired)} expired)")
+        return evicted
+
+    def compact(self):
+        """Rewrite the collection without deleted entries and vacuum the sqlite file.
+
+        Chroma only marks deletions, so the HNSW index and database keep their
+        size until the collection is rebuilt. Stored embeddings are reused.
+        """
+        if self.vector_store is None:
+            return {"bytes_before": 0, "bytes_after": 0}
+
+        bytes_before = _directory_size(self.persist_directory)
+        if self._is_sharded():
+            chunks = self.vector_store.compact()
+        else:
+            self.vector_store._collection = compact_collection(
+                self.vector_store._client,
+                self.vector_store._collection,
+                self.persist_directory
+            )
+            chunks = self.vector_store._collection.count()
+        bytes_after = _directory_size(self.persist_directory)
+        self.logger.info(f"🗜️ Compacted vector store: {bytes_before:,} -> {bytes_after:,} bytes")
+        return {"chunks": chunks, "bytes_before": bytes_before, "bytes_after": bytes_after}
+
+    def _open_sharded_index(self):
+        from sharded_index import ShardedIndex
+
+        index = ShardedIndex(
+            self.persist_directory,
+            self.embeddings,
+            num_shards=self.num_shards,
+            shard_by=self.shard_by or "source"
+        )
+        # num_shards=1 and shard_by=None mean "whatever the index already has"
+        count_changed = self.num_shards > 1 and index.num_shards != self.num_shards
+        key_changed = self.shard_by is not None and index.shard_by != self.shard_by
+        if count_changed or key_changed:
+            index.rebalance(self.num_shards if count_changed else index.num_shards, self.shard_by)
+        self.num_shards = index.num_shards
+        self.shard_by = index.shard_by
+        return index
+
+    def _is_sharded(self):
+        from sharded_index import ShardedIndex
+
+        return isinstance(self.vector_store, ShardedIndex)
+
+    def rebalance(self, num_shards, shard_by=None):
+        """Change the shard count (or placement) of a sharded index"""
+        if not self._is_sharded():
+            raise ValueError("rebalance needs a sharded index; create RAGEngine with num_shards > 1")
+        moved = self.vector_store.rebalance(num_shards, shard_by)
+        self.num_shards = num_shards
+        self.shard_by = self.vector_store.shard_by
+        return moved
+
+    def search_documents(self, query, num_results=3):
+        """Search and keep each chunk's metadata"""
         if self.vector_store is None:
             return []
 
         try:
             results = self.vector_store.similarity_search(query, k=num_results)
-            return [doc.page_content for doc in results]
         except Exception as e:
             self.logger.error(f"❌ Search error: {e}")
             return []
 
+        self._mark_retrieved(doc.metadata.get("chunk_id") for doc in results)
+        return results
+
+    def search(self, query, num_results=3):
+        """Search for relevant information"""
+        return [doc.page_content for doc in self.search_documents(query, num_results)]
+
     def _expand_business_query(self, query):
         """Expand common business questions with relevant keywords"""
         query_lower = query.lower()
@@ -89,24 +415,30 @@ class RAGEngine:
         
         return query
 
-    def get_context(self, query):
-        """Get context with better search strategy"""
+    def retrieve(self, query):
+        """Relevant chunks for query, most relevant first, with metadata"""
        
-        relevant_docs = self.search(query, num_results=5)
+        relevant_docs = self.search_documents(query, num_results=5)
         
         
-        if not relevant_docs or len(' '.join(relevant_docs)) < 100:
+        if not relevant_docs or len(' '.join(doc.page_content for doc in relevant_docs)) < 100:
             expanded_query = self._expand_business_query(query)
             if expanded_query != query:
-                additional_docs = self.search(expanded_query, num_results=3)
+                additional_docs = self.search_documents(expanded_query, num_results=3)
                 relevant_docs.extend(additional_docs)
         
         
-        unique_docs = list(dict.fromkeys(relevant_docs))
-        unique_docs.sort(key=len, reverse=True)  
-        
-        context = " ".join(unique_docs)
-        return context[:2000] 
+        unique_docs = {}
+        for doc in relevant_docs:
+            unique_docs.setdefault(doc.page_content, doc)
+        return list(unique_docs.values())
+
+    def get_context(self, query, docs=None):
+        """Get context with better search strategy, packed by relevance under the model's token budget"""
+        self._ensure_llm()
+        if docs is None:
+            docs = self.retrieve(query)
+        return self.context_packer.pack([doc.page_content for doc in docs], query)
 
     def _is_gibberish(self, text):
         """Check if the text looks like garbage output"""
@@ -176,12 +508,43 @@ class RAGEngine:
         return "Relevant information found but cannot extract specific answer."
 
     def answer_question(self, question):
-        """Answer question using safe extraction without LLM gibberish"""
-        context = self.get_context(question)
+        """Answer question with batched generation when enabled, falling back to safe extraction"""
+        return self.answer_with_sources(question)[0]
+
+    def answer_with_sources(self, question):
+        """Like answer_question, but also return the metadata of the chunks retrieved"""
+        # Tags are built only if a profile is written, not on every question
+        tags = lambda: {"query": question, "documents": sorted(self.sources)}  # noqa: E731
+        with self.profiler.profile_request("answer_question", tags):
+            # Figures asked about a known metric come straight from the fact table
+            fact = self.fact_index.answer(question)
+            if fact is not None:
+                answer, facts = fact
+                self._mark_retrieved([record["chunk_id"] for record in facts])
+                return answer, self._fact_sources(facts)
+            docs = self.retrieve(question)
+            context = self.get_context(question, docs)
+            return self._answer_from_context(question, context), [doc.metadata for doc in docs]
+
+    def _fact_sources(self, facts):
+        """Stored metadata of the chunks behind a fact answer, plus the fact fields,
+        so fact and vector answers report sources in the same shape"""
+        stored = self.vector_store.get(ids=[record["chunk_id"] for record in facts], include=["metadatas"])
+        metadatas = dict(zip(stored["ids"], stored["metadatas"]))
+        return [{**(metadatas.get(record["chunk_id"]) or {}), **record} for record in facts]
 
+    def _answer_from_context(self, question, context):
         if not context or len(context.strip()) < 50:
             return "I couldn't find relevant information about this topic in your documents."
 
+        if self.llm_available and self.generator is not None:
+            try:
+                answer = self.generator.generate(question, context)
+                if not self._is_gibberish(answer):
+                    return answer
+            except Exception as e:
+                self.logger.warning(f"⚠️ Generation failed, using extraction: {e}")
+
        
         try:
             answer = self._extract_best_answer(context, question)
@@ -204,4 +567,70 @@ class RAGEngine:
         total_chunks = len(self.documents)
         total_text = sum(len(doc) for doc in self.documents)
         
-        return f"Loaded {total_chunks} document chunks with {total_text:,} total characters"
\ No newline at end of file
+        return f"Loaded {total_chunks} document chunks with {total_text:,} total characters"
+
+
+def compact_collection(client, collection, persist_directory):
+    """Rebuild a Chroma collection from its stored embeddings and vacuum sqlite.
+
+    The copy is built under a temporary name and swapped in only once it is
+    complete; recover_compaction cleans up after a run that was interrupted.
+    """
+    name = collection.name
+    temp_name = name + COMPACT_SUFFIX
+    if temp_name in {existing.name for existing in client.list_collections()}:
+        client.delete_collection(temp_name)
+
+    stored = collection.get(include=["embeddings", "documents", "metadatas"])
+    new = client.create_collection(
+        name=temp_name,
+        metadata=collection.metadata,
+        embedding_function=collection._embedding_function
+    )
+    batch = 5000
+    for start in range(0, len(stored["ids"]), batch):
+        end = start + batch
+        new.add(
+            ids=stored["ids"][start:end],
+            embeddings=stored["embeddings"][start:end],
+            documents=stored["documents"][start:end],
+            metadatas=stored["metadatas"][start:end]
+        )
+
+    client.delete_collection(name)
+    new.modify(name=name)
+
+    sqlite_path = os.path.join(persist_directory, "chroma.sqlite3")
+    if os.path.exists(sqlite_path):
+        try:
+            with sqlite3.connect(sqlite_path) as connection:
+                connection.execute("VACUUM")
+        except sqlite3.Error as e:
+            setup_logging().warning(f"⚠️ Could not vacuum {sqlite_path}: {e}")
+    return new
+
+
+def recover_compaction(client, name):
+    """Finish or roll back a compact_collection that was interrupted.
+
+    If the original collection still exists the copy never completed, so it
+    is dropped. If only the copy exists, the crash came after the original
+    was deleted, and the complete copy takes its name.
+    """
+    names = {existing.name for existing in client.list_collections()}
+    temp_name = name + COMPACT_SUFFIX
+    if temp_name not in names:
+        return
+    if name in names:
+        client.delete_collection(temp_name)
+    else:
+        client.get_collection(temp_name).modify(name=name)
+        setup_logging().info(f"♻️ Restored collection {name} from an interrupted compaction")
+
+
+def _directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
@@ -0,0 +1,348 @@
+"""Vector index split across N Chroma shards, each owned by its own process.
+
+Queries are embedded once, sent to every shard at the same time, and the
+per-shard top-k lists (already sorted by distance) are merged with a heap.
+Chunks are placed by a stable hash of their source (so one filing lives on
+one shard) or of their chunk id (for the most even spread).
+"""
+import hashlib
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+from concurrent.futures import Future
+
+from utils import setup_logging
+
+MANIFEST_NAME = "shards.json"
+COLLECTION_NAME = "langchain"
+
+
+def _shard_worker(path, conn):
+    """Shard process: owns one persistent Chroma collection and serves requests"""
+    import chromadb
+    from chromadb.config import Settings
+
+    from rag_engine import compact_collection, recover_compaction
+
+    client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+    recover_compaction(client, COLLECTION_NAME)
+    collection = client.get_or_create_collection(COLLECTION_NAME)
+
+    while True:
+        request_id, op, args = conn.recv()
+        try:
+            if op == "close":
+                conn.send((request_id, "ok", None))
+                return
+            elif op == "add":
+                ids, embeddings, documents, metadatas = args
+                collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+                result = len(ids)
+            elif op == "query":
+                embedding, k = args
+                count = collection.count()
+                result = []
+                if count:
+                    found = collection.query(
+                        query_embeddings=[embedding],
+                        n_results=min(k, count),
+                        include=["documents", "metadatas", "distances"]
+                    )
+                    result = list(zip(found["distances"][0], found["ids"][0],
+                                      found["documents"][0], found["metadatas"][0]))
+            elif op == "get":
+                kwargs = args
+                result = collection.get(**kwargs)
+                result = {key: value for key, value in result.items() if value is not None}
+            elif op == "delete":
+                # Deletes are broadcast, so only touch the ids this shard holds
+                existing = collection.get(ids=args, include=[])["ids"] if args else []
+                if existing:
+                    collection.delete(ids=existing)
+                result = len(existing)
+            elif op == "count":
+                result = collection.count()
+            elif op == "compact":
+                collection = compact_collection(client, collection, path)
+                result = collection.count()
+            else:
+                raise ValueError(f"Unknown shard operation: {op}")
+            conn.send((request_id, "ok", result))
+        except Exception as e:
+            conn.send((request_id, "error", f"{type(e).__name__}: {e}"))
+
+
+class _Shard:
+    """Parent-side handle for one shard process.
+
+    Requests are tagged with an id and written under a per-shard lock; a
+    reader thread routes each reply to the Future of the request it answers.
+    Many callers can therefore have requests queued on the same shard, and
+    no caller holds a lock while waiting for a reply.
+    """
+
+    def __init__(self, context, path):
+        parent, child = context.Pipe()
+        self.process = context.Process(target=_shard_worker, args=(path, child), daemon=True)
+        self.process.start()
+        child.close()
+        self.conn = parent
+        self._send_lock = threading.Lock()
+        self._pending = {}
+        self._ids = itertools.count()
+        self._reader = threading.Thread(target=self._read_replies, name="shard-reader", daemon=True)
+        self._reader.start()
+
+    def submit(self, op, args=None):
+        future = Future()
+        with self._send_lock:
+            if self._reader is None or not self._reader.is_alive():
+                raise RuntimeError("Shard process is not running")
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            self.conn.send((request_id, op, args))
+        return future
+
+    def _read_replies(self):
+        try:
+            while True:
+                request_id, status, result = self.conn.recv()
+                future = self._pending.pop(request_id)
+                if status == "ok":
+                    future.set_result(result)
+                else:
+                    future.set_exception(RuntimeError(f"Shard error: {result}"))
+        except (EOFError, OSError):
+            pass
+        with self._send_lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError("Shard process exited"))
+
+    def stop(self):
+        try:
+            self.submit("close").result(timeout=30)
+        except (RuntimeError, TimeoutError):
+            pass
+        self.process.join(timeout=5)
+        self._reader.join(timeout=5)
+        self.conn.close()
+
+
+class ShardedIndex:
+    """Drop-in for the parts of langchain's Chroma wrapper that RAGEngine uses"""
+
+    def __init__(self, persist_directory, embedding_function, num_shards=4, shard_by="source"):
+        if shard_by not in ("source", "hash"):
+            raise ValueError("shard_by must be 'source' or 'hash'")
+        self.logger = setup_logging()
+        self.persist_directory = persist_directory
+        self.embedding_function = embedding_function
+        self.shard_by = shard_by
+        self.generation = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._shards = []
+
+        manifest = self._read_manifest()
+        if manifest:
+            self.generation = manifest["generation"]
+            self.shard_by = manifest["shard_by"]
+            num_shards = manifest["num_shards"]
+        else:
+            # Leftovers of a migration that stopped before the manifest was written
+            shutil.rmtree(self._generation_dir(self.generation), ignore_errors=True)
+        self._shards = self._start_shards(num_shards, self.generation)
+        if manifest:
+            return
+        try:
+            migrated = self._migrate_single_collection()
+        except Exception:
+            self.close()
+            raise
+        self._write_manifest()
+        if migrated:
+            self._drop_single_collection()
+
+    def _single_collection_client(self):
+        """Client for an unsharded Chroma index in persist_directory, if there is one"""
+        if not os.path.exists(os.path.join(self.persist_directory, "chroma.sqlite3")):
+            return None
+        import chromadb
+        from chromadb.config import Settings
+
+        from rag_engine import recover_compaction
+
+        # Same settings RAGEngine and langchain use for this path
+        client = chromadb.Client(Settings(is_persistent=True, persist_directory=self.persist_directory))
+        recover_compaction(client, COLLECTION_NAME)
+        if COLLECTION_NAME not in {collection.name for collection in client.list_collections()}:
+            return None
+        return client
+
+    def _migrate_single_collection(self):
+        """Copy an existing unsharded index into the new shards.
+
+        Stored embeddings are copied, as in rebalance. The original stays in
+        place until the manifest is written, so an interrupted migration
+        simply runs again on the next open.
+        """
+        client = self._single_collection_client()
+        if client is None:
+            return 0
+        stored = client.get_collection(COLLECTION_NAME).get(include=["embeddings", "documents", "metadatas"])
+        batch = 5000
+        for start in range(0, len(stored["ids"]), batch):
+            end = start + batch
+            self._add(stored["ids"][start:end], stored["embeddings"][start:end],
+                      stored["documents"][start:end], stored["metadatas"][start:end], self._shards)
+        self.logger.info(f"🔀 Migrated {len(stored['ids'])} chunks from the unsharded index onto "
+                         f"{self.num_shards} shards by {self.shard_by}")
+        return len(stored["ids"])
+
+    def _drop_single_collection(self):
+        client = self._single_collection_client()
+        if client is not None:
+            client.delete_collection(COLLECTION_NAME)
+
+    @staticmethod
+    def exists(persist_directory):
+        return os.path.exists(os.path.join(persist_directory, MANIFEST_NAME))
+
+    @property
+    def num_shards(self):
+        return len(self._shards)
+
+    def _read_manifest(self):
+        path = os.path.join(self.persist_directory, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+
+    def _write_manifest(self):
+        os.makedirs(self.persist_directory, exist_ok=True)
+        path = os.path.join(self.persist_directory, MANIFEST_NAME)
+        with open(path + ".tmp", "w", encoding='utf-8') as file:
+            json.dump({"generation": self.generation, "num_shards": self.num_shards, "shard_by": self.shard_by}, file)
+        os.replace(path + ".tmp", path)
+
+    def _generation_dir(self, generation):
+        return os.path.join(self.persist_directory, f"shards-{generation}")
+
+    def _start_shards(self, num_shards, generation):
+        shards = []
+        for i in range(num_shards):
+            path = os.path.join(self._generation_dir(generation), f"shard-{i}")
+            os.makedirs(path, exist_ok=True)
+            shards.append(_Shard(self._context, path))
+        return shards
+
+    def _call(self, requests, shards=None):
+        """Send one (op, args) per shard, then collect replies; shards work in parallel"""
+        shards = shards or self._shards
+        futures = [shard.submit(*request) if request is not None else None
+                   for shard, request in zip(shards, requests)]
+        return [future.result() if future is not None else None for future in futures]
+
+    def _broadcast(self, op, args=None, shards=None):
+        shards = shards or self._shards
+        return self._call([(op, args)] * len(shards), shards)
+
+    def shard_for(self, chunk_id, metadata, num_shards=None):
+        key = (metadata or {}).get("source", "") if self.shard_by == "source" else chunk_id
+        digest = hashlib.md5(key.encode("utf-8")).digest()
+        return int.from_bytes(digest[:4], "little") % (num_shards or self.num_shards)
+
+    def _add(self, ids, embeddings, documents, metadatas, shards):
+        groups = [([], [], [], []) for _ in shards]
+        for row in zip(ids, embeddings, documents, metadatas):
+            group = groups[self.shard_for(row[0], row[3], len(shards))]
+            for column, value in zip(group, row):
+                column.append(value)
+        self._call([("add", group) if group[0] else None for group in groups], shards)
+
+    def add_documents(self, documents, ids):
+        """Embed in this process, then send each chunk to its shard"""
+        texts = [doc.page_content for doc in documents]
+        embeddings = self.embedding_function.embed_documents(texts)
+        self._add(ids, embeddings, texts, [doc.metadata for doc in documents], self._shards)
+        return ids
+
+    def similarity_search_with_score(self, query, k=4):
+        from langchain.schema import Document as LangchainDoc
+
+        embedding = self.embedding_function.embed_query(query)
+        per_shard = self._broadcast("query", (embedding, k))
+        merged = itertools.islice(heapq.merge(*per_shard, key=lambda hit: hit[0]), k)
+        return [(LangchainDoc(page_content=document, metadata=metadata or {}), distance)
+                for distance, _, document, metadata in merged]
+
+    def similarity_search(self, query, k=4):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def get(self, ids=None, where=None, include=None):
+        kwargs = {"include": ["metadatas", "documents"] if include is None else include}
+        if ids is not None:
+            kwargs["ids"] = ids
+        if where is not None:
+            kwargs["where"] = where
+        combined = {}
+        for result in self._broadcast("get", kwargs):
+            for key, values in result.items():
+                combined.setdefault(key, []).extend(values)
+        combined.setdefault("ids", [])
+        return combined
+
+    def delete(self, ids=None):
+        self._broadcast("delete", list(ids or []))
+
+    def count(self):
+        return sum(self._broadcast("count"))
+
+    def compact(self):
+        return sum(self._broadcast("compact"))
+
+    def rebalance(self, num_shards, shard_by=None):
+        """Move every chunk into a fresh set of num_shards shards.
+
+        Stored embeddings are copied, not recomputed. The manifest switches
+        to the new generation only after the copy finished, so an
+        interrupted rebalance leaves the old shards in use.
+        """
+        shard_by = shard_by or self.shard_by
+        stored = self.get(include=["embeddings", "documents", "metadatas"])
+        old_shards, old_generation = self._shards, self.generation
+
+        new_generation = old_generation + 1
+        shutil.rmtree(self._generation_dir(new_generation), ignore_errors=True)
+        new_shards = self._start_shards(num_shards, new_generation)
+        previous_shard_by, self.shard_by = self.shard_by, shard_by
+        try:
+            batch = 5000
+            for start in range(0, len(stored["ids"]), batch):
+                end = start + batch
+                self._add(stored["ids"][start:end], stored["embeddings"][start:end],
+                          stored["documents"][start:end], stored["metadatas"][start:end], new_shards)
+        except Exception:
+            self.shard_by = previous_shard_by
+            self._stop(new_shards)
+            raise
+
+        self._shards, self.generation = new_shards, new_generation
+        self._write_manifest()
+        self._stop(old_shards)
+        shutil.rmtree(self._generation_dir(old_generation), ignore_errors=True)
+        self.logger.info(f"🔀 Rebalanced {len(stored['ids'])} chunks onto {num_shards} shards by {shard_by}")
+        return len(stored["ids"])
+
+    def _stop(self, shards):
+        for shard in shards:
+            shard.stop()
+
+    def close(self):
+        self._stop(self._shards)
+        self._shards = []
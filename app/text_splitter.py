@@ -0,0 +1,174 @@
+import re
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from operator import sub
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", ". ", "? ", "! ", " ", ""]
+PAGE_JOINER = "\n\n"
+
+_match_start = type(re.match("", "")).start
+
+
+class Chunk:
+    """A piece of a document plus where it came from"""
+
+    __slots__ = ("text", "source", "page_start", "page_end", "start_offset", "end_offset", "section")
+
+    def __init__(self, text, source="", page_start=1, page_end=1, start_offset=0, end_offset=0):
+        self.text = text
+        self.source = source
+        self.page_start = page_start
+        self.page_end = page_end
+        self.start_offset = start_offset
+        self.end_offset = end_offset
+        self.section = "general"
+
+    def metadata(self):
+        """Flat provenance record, safe to store as vector store metadata"""
+        return {
+            "source": self.source,
+            "page_start": self.page_start,
+            "page_end": self.page_end,
+            "start_offset": self.start_offset,
+            "end_offset": self.end_offset,
+            "section": self.section,
+        }
+
+    def __repr__(self):
+        return (f"Chunk(source={self.source!r}, pages={self.page_start}-{self.page_end}, "
+                f"chars={self.start_offset}:{self.end_offset})")
+
+
+class PageAwareTextSplitter:
+    """Produces the same chunks as RecursiveCharacterTextSplitter (with
+    keep_separator=True and whitespace stripping), but works on offsets into
+    the original text instead of building, joining and re-splitting strings.
+
+    A region is cut before every occurrence of the first separator found in
+    it; pieces shorter than chunk_size are merged greedily with up to
+    chunk_overlap characters carried into the next chunk, and longer pieces
+    are split again with the remaining separators.
+    """
+
+    def __init__(self, chunk_size=1200, chunk_overlap=200, separators=None):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = list(separators) if separators is not None else list(DEFAULT_SEPARATORS)
+        # Literal patterns; the regex scanner finds occurrences faster than a str.find loop
+        self._patterns = {sep: re.compile(re.escape(sep)) for sep in self.separators if sep}
+
+    def _cuts(self, text, start, end, sep):
+        """Start offsets of the pieces of text[start:end]; each piece after the
+        first begins with the separator"""
+        if sep == "":
+            return list(range(start, end))
+        cuts = list(map(_match_start, self._patterns[sep].finditer(text, start, end)))
+        if not cuts or cuts[0] > start:
+            cuts.insert(0, start)
+        return cuts
+
+    def _split(self, text, start, end, separators, spans):
+        sep = separators[-1]
+        remaining = []
+        for i, candidate in enumerate(separators):
+            if candidate == "":
+                sep = candidate
+                break
+            if text.find(candidate, start, end) != -1:
+                sep = candidate
+                remaining = separators[i + 1:]
+                break
+
+        cuts = self._cuts(text, start, end, sep)
+        cuts.append(end)
+        size = self.chunk_size
+        lengths = list(map(sub, islice(cuts, 1, None), cuts))
+        if max(lengths) < size:
+            self._merge(cuts, 0, len(lengths), spans)
+            return
+
+        run_start = None
+        for i, length in enumerate(lengths):
+            if length < size:
+                if run_start is None:
+                    run_start = i
+                continue
+            if run_start is not None:
+                self._merge(cuts, run_start, i, spans)
+                run_start = None
+            if remaining:
+                self._split(text, cuts[i], cuts[i + 1], remaining, spans)
+            else:
+                spans.append((cuts[i], cuts[i + 1]))
+        if run_start is not None:
+            self._merge(cuts, run_start, len(lengths), spans)
+
+    def _merge(self, cuts, first, stop, spans):
+        """Merge the contiguous pieces cuts[first:stop] (each shorter than
+        chunk_size) into overlapping chunks.
+
+        Pieces are added while the chunk fits in chunk_size; then leading
+        pieces are dropped until at most chunk_overlap characters remain and
+        the next piece fits. Both steps are a bisect over the cut offsets, so
+        the cost is per chunk rather than per piece.
+        """
+        size, overlap = self.chunk_size, self.chunk_overlap
+        while True:
+            # Last cut that keeps cuts[first]..cuts[last] within chunk_size
+            last = bisect_right(cuts, cuts[first] + size, first + 1, stop + 1) - 1
+            spans.append((cuts[first], cuts[last]))
+            if last >= stop:
+                return
+            first = bisect_left(cuts, max(cuts[last] - overlap, cuts[last + 1] - size), first, last)
+
+    def _raw_spans(self, text):
+        """Untrimmed (start, end) offsets of each chunk, in order"""
+        spans = []
+        if text:
+            self._split(text, 0, len(text), self.separators, spans)
+        return spans
+
+    def _trimmed(self, text):
+        """Yield (start, end, chunk text) with surrounding whitespace removed"""
+        for s, e in self._raw_spans(text):
+            piece = text[s:e]
+            body = piece.strip()
+            if body:
+                # Everything before the first character of body is whitespace
+                s += piece.index(body[0])
+                yield s, s + len(body), body
+
+    def split_spans(self, text):
+        """(start, end) offsets of each whitespace-trimmed chunk, in order"""
+        return [(s, e) for s, e, _ in self._trimmed(text)]
+
+    def split_text(self, text):
+        """Drop-in replacement for RecursiveCharacterTextSplitter.split_text"""
+        return [chunk for chunk in (text[s:e].strip() for s, e in self._raw_spans(text)) if chunk]
+
+    def split_pages(self, pages, source=""):
+        """Split a list of page texts into Chunks that record their page range
+        and character offsets in the page-joined document text."""
+        text = PAGE_JOINER.join(pages)
+        # Offset just past each page; chunk offsets only move forward, so the
+        # page of each end is found by walking a pointer instead of bisecting
+        page_ends = []
+        offset = 0
+        for page in pages:
+            offset += len(page)
+            page_ends.append(offset)
+            offset += len(PAGE_JOINER)
+
+        chunks = []
+        first_page = last_page = 0
+        for s, e, body in self._trimmed(text):
+            while page_ends[first_page] <= s:
+                first_page += 1
+            if last_page < first_page:
+                last_page = first_page
+            while page_ends[last_page] < e:
+                last_page += 1
+            chunks.append(Chunk(body, source, first_page + 1, last_page + 1, s, e))
+        return chunks
@@ -1,4 +1,8 @@
 import logging
+import threading
+
+_model_lock = threading.Lock()
+_models = {}
 
 def setup_logging():
     """Simple logging setup"""
@@ -15,3 +19,47 @@ def format_actions(steps):
 def get_file_type(filename):
     """Get file extension"""
     return filename.lower().split('.')[-1]
+
+
+def _load_once(name, factory):
+    """Build a shared model the first time it is asked for"""
+    if name not in _models:
+        with _model_lock:
+            if name not in _models:
+                _models[name] = factory()
+    return _models[name]
+
+def load_embeddings():
+    """Shared sentence embedding model (imports langchain on first use)"""
+    def factory():
+        from langchain.embeddings import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    return _load_once("embeddings", factory)
+
+def load_llm():
+    """Shared Flan-T5 pipeline (imports transformers and torch on first use)"""
+    def factory():
+        from transformers import pipeline
+        return pipeline(
+            "text2text-generation",
+            model="google/flan-t5-small",
+            max_length=300,
+            truncation=True
+        )
+    return _load_once("llm", factory)
+
+def warm_up(include_llm=True):
+    """Load heavy models on a background thread so the first page isn't blocked"""
+    def run():
+        logger = setup_logging()
+        try:
+            load_embeddings()
+            import langchain.vectorstores  # noqa: F401  pulls in chromadb
+            if include_llm:
+                load_llm()
+            logger.info("Model warm-up finished")
+        except Exception as e:
+            logger.warning(f"Model warm-up failed: {e}")
+    thread = threading.Thread(target=run, name="model-warmup", daemon=True)
+    thread.start()
+    return thread
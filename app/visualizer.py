@@ -1,11 +1,11 @@
-import matplotlib.pyplot as plt
-import numpy as np
-from wordcloud import WordCloud
 import io
 import base64
 
+# matplotlib and wordcloud are slow to import, so they load on first chart
+
 def create_simple_chart(insights, document_text):
     """Create a simple visualization of insights"""
+    import matplotlib.pyplot as plt
    
     business_terms = ['sales', 'customer', 'growth', 'market', 'profit', 'risk']
     counts = [document_text.lower().count(term) for term in business_terms]
@@ -59,6 +59,9 @@ def create_word_cloud(text):
         return None
         
     try:
+        import matplotlib.pyplot as plt
+        from wordcloud import WordCloud
+
         wordcloud = WordCloud(
             width=400, 
             height=200, 
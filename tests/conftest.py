@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+# The app modules import each other by bare name (python app/main.py style)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+
+@pytest.fixture
+def make_engine(tmp_path):
+    """Factory for RAGEngines on tmp_path with fake embeddings; sharded ones are closed afterwards"""
+    pytest.importorskip("chromadb")
+    embeddings_module = pytest.importorskip("langchain.embeddings")
+    from rag_engine import RAGEngine
+
+    engines = []
+
+    def make(**kwargs):
+        engine = RAGEngine(persist_directory=str(tmp_path), embedding_function=embeddings_module.FakeEmbeddings(size=16),
+                           **kwargs)
+        engine.load_persisted()
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        if hasattr(engine.vector_store, "close"):
+            engine.vector_store.close()
+
+
+@pytest.fixture
+def add_chunks():
+    """add_chunks(engine, count, sources=1): numbered chunks spread round-robin over report-N.txt files"""
+    def add(engine, count, sources=1):
+        engine.add_documents([(f"chunk {i} sales were {i} million", f"report-{i % sources}.txt", {})
+                              for i in range(count)])
+    return add
@@ -0,0 +1,128 @@
+import pytest
+
+from fact_index import KIND_MONEY, KIND_PERCENT, FactIndex, parse_question
+
+
+@pytest.mark.parametrize("question", [
+    "What were the main drivers of sales growth?",
+    "What was the impact of the Stelara biosimilar on sales?",
+    "What were the risks to revenue from the Inflation Reduction Act?",
+    "What is the total litigation exposure related to talc and how does it affect net income?",
+    "What drove sales in 2023?",
+    "Tell me about research and development.",
+    "What are the major risk factors mentioned?",
+    "What is the revenue recognition policy?",
+    "What is the income tax rate?",
+    "What were the sales of Stelara in 2023?",
+    "What was the sales growth in the MedTech segment?",
+    "What were the sales in Europe?",
+    "What are the sales and marketing expenses?",
+])
+def test_qualitative_questions_go_to_vector_search(question):
+    assert parse_question(question) is None
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("How much was invested in research and development?", (["rd"], [], KIND_MONEY)),
+    ("What was the dividend in 2019?", (["dividend"], [2019], None)),
+    ("What were total sales?", (["sales"], [], None)),
+    ("What was the net income?", (["net_income"], [], None)),
+    ("Sales growth in 2022?", (["sales"], [2022], KIND_PERCENT)),
+    ("What were sales and net income in 2022 and 2023?", (["sales", "net_income"], [2022, 2023], None)),
+])
+def test_figure_questions_go_to_the_table(question, expected):
+    assert parse_question(question) == expected
+
+
+def facts(index, metric):
+    return sorted((index.year[row], index.kind[row], index.value[row])
+                  for row in range(len(index.value)) if index.alive[row] and index.metric[row] == metric)
+
+
+def test_extraction_years_and_scales():
+    index = FactIndex()
+    index.add_chunk("c1", "Worldwide sales were $85.2 billion in 2023, up 6.5% from 2022. "
+                          "Research and development expense was 15,085 million in 2022. "
+                          "Net earnings: $35,153 for the year.")
+    # "$85.2 billion in 2023" takes the following year; "6.5% from 2022" is growth in 2023, the nearer year
+    assert facts(index, 0) == [(2023, KIND_MONEY, 85.2e9), (2023, KIND_PERCENT, 6.5)]
+    assert facts(index, 1) == [(2022, KIND_MONEY, 15085e6)]
+    assert facts(index, 2) == [(0, KIND_MONEY, 35153.0)]
+
+
+def test_answer_prefers_requested_year_and_kind():
+    index = FactIndex()
+    index.add_chunk("c1", "Sales were $80.0 billion in 2022.", "a.txt")
+    index.add_chunk("c2", "Sales were $85.2 billion in 2023, up 6.5 percent.", "a.txt")
+
+    answer, sources = index.answer("How much were sales in 2022?")
+    assert answer == "Sales were $80.0 billion in 2022."
+    assert sources[0]["chunk_id"] == "c1" and sources[0]["year"] == 2022
+
+    _, sources = index.answer("What were sales?")
+    assert sources[0]["year"] == 2023 and sources[0]["kind"] == "money"
+
+
+def test_sources_that_disagree_are_not_answered():
+    index = FactIndex()
+    index.add_chunk("c1", "Sales were $85.2 billion in 2023.", "f1.txt")
+    index.add_chunk("c2", "Sales were $12.4 billion in 2023.", "f2.txt")
+    index.add_chunk("c3", "Sales were $3.1 billion in 2022.", "f3.txt")
+    index.add_chunk("c4", "Worldwide sales of $85.2 billion in 2023.", "press.txt")
+
+    assert index.answer("What were sales in 2023?") is None
+    assert index.answer("What were sales?") is None
+    _, facts = index.answer("What were sales in 2023?", source="f2.txt")
+    assert facts[0]["chunk_id"] == "c2" and facts[0]["value"] == 12.4e9
+
+    # Filings quoting the same figure do agree
+    index.remove_chunks(["c2"])
+    assert index.answer("What were sales in 2023?")[1][0]["value"] == 85.2e9
+
+
+def test_removing_the_best_row_falls_back_to_the_next():
+    index = FactIndex()
+    index.add_chunk("c1", "Sales: $85.2 billion in 2023.", "f1.txt")
+    index.add_chunk("c2", "Sales for the full year came in at $85.2 billion in 2023.", "f1.txt")
+    assert index.answer("What were sales in 2023?")[1][0]["chunk_id"] == "c1"
+
+    index.remove_chunks(["c1"])
+    assert index.answer("What were sales in 2023?")[1][0]["chunk_id"] == "c2"
+    index.remove_chunks(["c2"])
+    assert index.answer("What were sales in 2023?") is None
+    assert len(index) == 0 and not index._best and not index._by_metric_year
+
+
+def test_compact_drops_tombstones():
+    index = FactIndex()
+    for i in range(10):
+        index.add_chunk(f"c{i}", f"Sales were ${i + 1} billion in {2010 + i}.", f"s{i}.txt")
+    index.remove_chunks([f"c{i}" for i in range(0, 10, 2)])
+    before = index.answer("What were sales in 2019?")
+    assert before is not None
+    assert len(index) == 5 and len(index.value) == 10
+
+    index.compact()
+    assert len(index) == len(index.value) == 5
+    assert index.chunk_ids == ["c1", "c3", "c5", "c7", "c9"]
+    assert index.answer("What were sales in 2019?") == before
+    assert index.answer("What were sales in 2010?") is None
+
+    # Rows that survived compaction can still be removed
+    index.remove_chunks(["c9"])
+    assert index.lookup("sales", [2019]) is None
+    assert len(index) == 4
+
+
+def test_fact_answers_count_as_retrieval(make_engine):
+    engine = make_engine()
+    engine.add_documents([("Sales were $85.2 billion in 2023.", "a.txt", {"page_start": 4, "page_end": 4}),
+                          ("The company opened a new plant.", "b.txt", {"page_start": 9, "page_end": 9})])
+    _, sources = engine.answer_with_sources("What were sales in 2023?")
+
+    touched = {chunk_id for chunk_id, record in engine.chunk_index.items()
+               if record["last_retrieved"] > record["added_at"]}
+    assert touched == {sources[0]["chunk_id"]}
+    # Same chunk metadata a vector answer reports, plus the fact fields
+    assert sources[0]["page_start"] == 4 and sources[0]["source"] == "a.txt" and "added_at" in sources[0]
+    assert sources[0]["metric"] == "sales" and sources[0]["value"] == 85.2e9
@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+
+from generation import ContextPacker, GenerationService
+
+
+class EchoService(GenerationService):
+    """GenerationService with the model call replaced; batches wait for release"""
+
+    def __init__(self, **kwargs):
+        self.release = threading.Event()
+        self.prompts = []
+        super().__init__(model=None, tokenizer=None, **kwargs)
+
+    def _generate_batch(self, prompts):
+        self.release.wait(5)
+        self.prompts.extend(prompts)
+        return [prompt.rsplit("Question: ", 1)[1].split("\n")[0].upper() for prompt in prompts]
+
+
+def test_identical_requests_share_one_generation():
+    service = EchoService(max_wait_ms=1)
+    try:
+        first = service.submit("what were sales?", "ctx")
+        second = service.submit("What were sales?  ", "ctx")
+        assert second is first
+        service.release.set()
+        assert first.result(5) == "WHAT WERE SALES?"
+
+        assert service.generate("what were sales?", "ctx", timeout=5) == "WHAT WERE SALES?"
+        assert len(service.prompts) == 1
+        assert service.stats["requests"] == 3
+        assert service.stats["deduplicated"] == 1
+        assert service.stats["cache_hits"] == 1
+    finally:
+        service.close()
+
+
+def test_close_finishes_queued_requests_and_rejects_new_ones():
+    service = EchoService(max_batch_size=2, max_wait_ms=1)
+    futures = [service.submit(f"q{i}", "ctx") for i in range(5)]
+    service.release.set()
+    service.close()
+
+    assert [future.result(5) for future in futures] == [f"Q{i}" for i in range(5)]
+    with pytest.raises(RuntimeError):
+        service.submit("late", "ctx")
+    # Answers already cached are still served after close
+    assert service.generate("q0", "ctx", timeout=1) == "Q0"
+
+
+def test_submit_racing_close_never_hangs():
+    for _ in range(20):
+        service = EchoService(max_wait_ms=0)
+        service.release.set()
+        futures = []
+
+        def submit_many():
+            for i in range(50):
+                try:
+                    futures.append(service.submit(f"q{i}", "ctx"))
+                except RuntimeError:
+                    return
+
+        thread = threading.Thread(target=submit_many)
+        thread.start()
+        service.close()
+        thread.join()
+        for future in futures:
+            future.result(timeout=5)
+
+
+def test_packer_keeps_relevance_order_within_budget():
+    packer = ContextPacker(max_input_tokens=80, min_fragment_tokens=4)
+    docs = ["a" * 80, "b" * 80, "c" * 400]
+    packed = packer.pack(docs, "q?")
+    assert packed.startswith("a" * 80 + " " + "b" * 80)
+    assert packer.count_tokens(packed) <= packer.max_input_tokens
@@ -0,0 +1,5 @@
+from benchmark import check_import_budget
+
+
+def test_cold_import_stays_within_budget():
+    assert check_import_budget()
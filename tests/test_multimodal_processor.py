@@ -0,0 +1,40 @@
+import io
+
+import pytest
+
+pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from multimodal_processor import MultimodalProcessor
+
+
+def png_bytes(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_results_are_cached_by_content():
+    processor = MultimodalProcessor()
+    red, blue = png_bytes((255, 0, 0)), png_bytes((0, 0, 255))
+
+    first = processor.analyze_images([red, blue, red])
+    assert first[0]["hash"] == first[2]["hash"] != first[1]["hash"]
+    assert (first[0]["width"], first[0]["height"]) == (64, 48)
+
+    again = processor.analyze_images([red])
+    assert again[0] == first[0]
+
+
+def test_mutating_a_result_does_not_change_the_cache():
+    processor = MultimodalProcessor()
+    red = png_bytes((255, 0, 0))
+
+    first = processor.analyze_images([red, red])
+    first[0]["note"] = "edited"
+    assert "note" not in first[1]
+
+    second = processor.analyze_images([red])[0]
+    assert "note" not in second
+    second["visual_type"] = "edited"
+    assert processor.analyze_images([red])[0]["visual_type"] != "edited"
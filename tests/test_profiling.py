@@ -0,0 +1,65 @@
+import os
+import threading
+import time
+
+from profiling import Profiler
+
+
+def make_profiler(tmp_path, **settings):
+    profiler = Profiler()
+    profiler.configure(output_dir=str(tmp_path), interval_ms=1, **settings)
+    return profiler
+
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_enabling_alone_keeps_slow_requests(tmp_path, monkeypatch):
+    for name in ("BIZ_PROFILE_SAMPLE_RATE", "BIZ_PROFILE_THRESHOLD_MS"):
+        monkeypatch.delenv(name, raising=False)
+    profiler = make_profiler(tmp_path, enabled=True)
+    assert profiler.threshold_ms == 1000
+
+    profiler.configure(threshold_ms=20)
+    with profiler.profile_request("answer_question", {"query": "q"}):
+        spin(0.05)
+    assert any(name.endswith(".folded") for name in os.listdir(tmp_path))
+
+
+def test_profiles_of_the_same_query_do_not_overwrite(tmp_path):
+    profiler = make_profiler(tmp_path, enabled=True, sample_rate=1.0)
+    for _ in range(3):
+        with profiler.profile_request("answer_question", {"query": "q"}):
+            spin(0.01)
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".folded")]) == 3
+
+
+def test_work_on_other_threads_is_sampled(tmp_path):
+    profiler = make_profiler(tmp_path, enabled=True, sample_rate=1.0)
+    with profiler.profile_request("answer_question"):
+        helper = threading.Thread(target=spin, args=(0.05,), name="generation-batcher")
+        helper.start()
+        helper.join()
+
+    folded = next(name for name in os.listdir(tmp_path) if name.endswith(".folded"))
+    with open(tmp_path / folded, encoding="utf-8") as file:
+        stacks = file.read()
+    assert "thread:generation-batcher;" in stacks and "spin (test_profiling.py" in stacks
+    assert "thread:MainThread;" in stacks and "stack-sampler" not in stacks
+
+
+def test_tags_are_only_built_for_written_profiles(tmp_path):
+    profiler = make_profiler(tmp_path, enabled=False)
+
+    def tags():
+        raise AssertionError("tags built with profiling off")
+
+    with profiler.profile_request("answer_question", tags):
+        pass
+    profiler.configure(enabled=True, sample_rate=1.0)
+    with profiler.profile_request("answer_question", lambda: {"query": "q"}):
+        spin(0.01)
+    assert os.listdir(tmp_path)
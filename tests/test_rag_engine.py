@@ -0,0 +1,62 @@
+import threading
+import time
+
+import rag_engine
+from rag_engine import RAGEngine
+
+
+class FakeTokenizer:
+    model_max_length = 512
+
+    def encode(self, text, add_special_tokens=False):
+        return text.split()
+
+    def decode(self, ids, skip_special_tokens=True):
+        return " ".join(ids)
+
+
+class FakePipeline:
+    tokenizer = FakeTokenizer()
+    model = None
+
+
+def test_concurrent_first_questions_wait_for_the_model(monkeypatch, tmp_path):
+    loads = []
+
+    def slow_load_llm():
+        loads.append(1)
+        time.sleep(0.2)
+        return FakePipeline()
+
+    monkeypatch.setattr(rag_engine, "load_llm", slow_load_llm)
+    engine = RAGEngine(persist_directory=str(tmp_path))
+    seen = []
+
+    def first_question():
+        engine._ensure_llm()
+        seen.append(engine.context_packer.tokenizer)
+
+    threads = [threading.Thread(target=first_question) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    assert len(seen) == 4 and all(isinstance(tokenizer, FakeTokenizer) for tokenizer in seen)
+
+
+def test_failed_model_load_falls_back_once(monkeypatch, tmp_path):
+    calls = []
+
+    def broken_load_llm():
+        calls.append(1)
+        raise OSError("no weights")
+
+    monkeypatch.setattr(rag_engine, "load_llm", broken_load_llm)
+    engine = RAGEngine(enable_generation=True, persist_directory=str(tmp_path))
+    engine._ensure_llm()
+    engine._ensure_llm()
+
+    assert calls == [1]
+    assert not engine.llm_available and engine.generator is None
@@ -0,0 +1,84 @@
+import time
+
+import pytest
+
+pytest.importorskip("chromadb")
+
+import rag_engine
+from rag_engine import COMPACT_SUFFIX, RetentionPolicy
+
+
+def test_unlimited_policy_skips_the_scan(make_engine, add_chunks):
+    engine = make_engine()
+    add_chunks(engine, 20)
+    engine.chunk_index = None  # any scan would fail
+    assert engine.enforce_retention() == 0
+
+
+def test_least_recently_retrieved_survives_restart(make_engine, add_chunks):
+    engine = make_engine()
+    add_chunks(engine, 10)
+    kept = sorted(engine.chunk_index)[:3]
+    time.sleep(0.01)
+    engine._mark_retrieved(kept)
+    engine.save_retrieval_times()
+
+    # A later run (e.g. 'cli.py compact') only knows what was written to disk
+    reopened = make_engine(retention=RetentionPolicy(max_chunks=3))
+    assert sorted(reopened.chunk_index) == kept
+
+
+def test_compact_keeps_every_chunk(make_engine, add_chunks):
+    engine = make_engine()
+    add_chunks(engine, 30)
+    engine.remove_chunks(sorted(engine.chunk_index)[:10])
+
+    assert engine.compact()["chunks"] == 20
+    names = [collection.name for collection in engine.vector_store._client.list_collections()]
+    assert names == ["langchain"]
+    assert len(make_engine().chunk_index) == 20
+
+
+def test_interrupted_copy_leaves_original_in_place(monkeypatch, make_engine, add_chunks):
+    engine = make_engine()
+    add_chunks(engine, 12)
+    client = engine.vector_store._client
+
+    def crash(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    original_create = client.create_collection
+
+    def create_then_fail_on_add(*args, **kwargs):
+        collection = original_create(*args, **kwargs)
+        monkeypatch.setattr(type(collection), "add", crash)
+        return collection
+
+    monkeypatch.setattr(client, "create_collection", create_then_fail_on_add)
+    with pytest.raises(KeyboardInterrupt):
+        engine.compact()
+    monkeypatch.undo()
+
+    reopened = make_engine()
+    assert len(reopened.chunk_index) == 12
+    names = {collection.name for collection in client.list_collections()}
+    assert "langchain" + COMPACT_SUFFIX not in names
+
+
+def test_crash_after_delete_restores_the_copy(tmp_path, monkeypatch, make_engine, add_chunks):
+    engine = make_engine()
+    add_chunks(engine, 12)
+    collection = engine.vector_store._collection
+
+    def crash(self, *args, **kwargs):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(type(collection), "modify", crash)
+    with pytest.raises(KeyboardInterrupt):
+        rag_engine.compact_collection(engine.vector_store._client, collection, str(tmp_path))
+    monkeypatch.undo()
+
+    names = {existing.name for existing in engine.vector_store._client.list_collections()}
+    assert names == {"langchain" + COMPACT_SUFFIX}
+    reopened = make_engine()
+    assert len(reopened.chunk_index) == 12
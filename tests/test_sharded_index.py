@@ -0,0 +1,61 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("chromadb")
+
+from sharded_index import ShardedIndex
+
+
+def test_unsharded_index_is_migrated(tmp_path, make_engine, add_chunks):
+    add_chunks(make_engine(), 60, sources=5)
+
+    engine = make_engine(num_shards=3)
+    assert ShardedIndex.exists(str(tmp_path))
+    assert engine.vector_store.num_shards == 3
+    assert engine.vector_store.count() == 60
+    assert len(engine.chunk_index) == 60
+    engine.vector_store.close()
+
+    # The sharded index is kept as is when the count is not given again
+    engine = make_engine()
+    assert engine.vector_store.num_shards == 3
+    assert engine.vector_store.count() == 60
+
+
+def test_changing_shard_by_rebalances(make_engine, add_chunks):
+    engine = make_engine(num_shards=2, shard_by="source")
+    add_chunks(engine, 40)
+    assert sorted(engine.vector_store._broadcast("count")) == [0, 40]
+    engine.vector_store.close()
+
+    engine = make_engine(num_shards=2, shard_by="hash")
+    assert engine.vector_store.shard_by == engine.shard_by == "hash"
+    assert engine.vector_store.generation == 1
+    assert 0 not in engine.vector_store._broadcast("count")
+    engine.vector_store.close()
+
+    # Not naming a placement keeps the stored one
+    engine = make_engine(num_shards=2)
+    assert engine.shard_by == "hash" and engine.vector_store.generation == 1
+
+
+def test_get_with_empty_include_returns_only_ids(make_engine, add_chunks):
+    engine = make_engine(num_shards=2)
+    add_chunks(engine, 10, sources=2)
+    assert set(engine.vector_store.get(where={"source": "report-0.txt"}, include=[])) == {"ids"}
+    assert engine.remove_source("report-0.txt") == 5
+    assert engine.vector_store.count() == 5
+
+
+def test_concurrent_queries_get_their_own_replies(make_engine, add_chunks):
+    engine = make_engine(num_shards=2)
+    add_chunks(engine, 40, sources=5)
+    index = engine.vector_store
+
+    def query(k):
+        return k, len(index.similarity_search(f"sales {k}", k=k))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for k, found in pool.map(query, [1, 2, 3, 4, 5, 6, 7, 8] * 4):
+            assert found == k
@@ -0,0 +1,97 @@
+import textwrap
+
+import pytest
+
+from text_splitter import DEFAULT_SEPARATORS, PAGE_JOINER, PageAwareTextSplitter
+
+PARAGRAPH = (
+    "Worldwide sales were $85.2 billion in 2023, an increase of 6.5% compared with the prior year. "
+    "Operational sales growth excluding the COVID-19 vaccine was 7.4%. "
+    "Research and development expense was $15.1 billion! Did litigation costs rise? They did."
+)
+
+
+def make_pages():
+    """Fixed input mixing blank-line paragraphs, wrapped lines, long words and runs of newlines"""
+    pages = []
+    for number in range(12):
+        paragraphs = [f"Page {number} paragraph {i}. " + PARAGRAPH * (1 + (number + i) % 4) for i in range(3)]
+        if number % 3 == 0:
+            page = "\n".join(textwrap.fill(paragraph, 70 + number) for paragraph in paragraphs)
+        elif number % 3 == 1:
+            page = "\n\n".join(paragraphs)
+        else:
+            page = "\n\n\n".join(paragraphs) + "\n" + "x" * 700
+        pages.append(page)
+    pages.insert(5, "")
+    return pages
+
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(1200, 200), (300, 50), (120, 0), (40, 39)])
+def test_chunks_match_langchain(chunk_size, chunk_overlap):
+    text_splitter = pytest.importorskip("langchain.text_splitter")
+    pages = make_pages()
+    text = PAGE_JOINER.join(pages)
+    expected = text_splitter.RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=DEFAULT_SEPARATORS
+    ).split_text(text)
+
+    splitter = PageAwareTextSplitter(chunk_size, chunk_overlap)
+    assert splitter.split_text(text) == expected
+    assert [chunk.text for chunk in splitter.split_pages(pages)] == expected
+
+
+def test_spans_point_into_joined_text():
+    pages = make_pages()
+    text = PAGE_JOINER.join(pages)
+    splitter = PageAwareTextSplitter(300, 50)
+    chunks = splitter.split_pages(pages, "report.pdf")
+
+    assert chunks
+    for chunk in chunks:
+        assert text[chunk.start_offset:chunk.end_offset] == chunk.text
+        assert chunk.text == chunk.text.strip()
+        assert len(chunk.text) <= 300
+        assert chunk.source == "report.pdf"
+    assert [(c.start_offset, c.end_offset) for c in chunks] == splitter.split_spans(text)
+
+
+def test_consecutive_chunks_overlap():
+    text = " ".join(f"word{i}" for i in range(400))
+    chunks = PageAwareTextSplitter(100, 30).split_pages([text])
+
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.start_offset < previous.end_offset
+        assert previous.end_offset - current.start_offset <= 30
+        assert current.start_offset > previous.start_offset
+
+
+def test_page_ranges():
+    pages = ["a" * 30, "", "b " * 40, "c" * 20, "d " * 150]
+    page_starts = []
+    offset = 0
+    for page in pages:
+        page_starts.append(offset)
+        offset += len(page) + len(PAGE_JOINER)
+
+    chunks = PageAwareTextSplitter(120, 20).split_pages(pages)
+    for chunk in chunks:
+        first = max(i for i, start in enumerate(page_starts) if start <= chunk.start_offset)
+        last = max(i for i, start in enumerate(page_starts) if start < chunk.end_offset)
+        assert (chunk.page_start, chunk.page_end) == (first + 1, last + 1)
+        assert set(chunk.text) - set(" \n") <= set("".join(pages[first:last + 1]))
+
+    assert (chunks[0].page_start, chunks[-1].page_end) == (1, 5)
+    assert any(chunk.page_start < chunk.page_end for chunk in chunks)
+
+
+def test_empty_input():
+    splitter = PageAwareTextSplitter()
+    assert splitter.split_text("") == []
+    assert splitter.split_pages([]) == []
+    assert splitter.split_pages(["  ", "\n"]) == []
+
+
+def test_overlap_must_be_smaller_than_size():
+    with pytest.raises(ValueError):
+        PageAwareTextSplitter(100, 100)